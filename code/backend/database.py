@@ -1,11 +1,57 @@
+import os
 import sqlite3
 import json
+import threading
+import time
 
 DB_NAME = "ai_pharmacist.db"
 
+# 연결 설정 (스레드마다 연결 하나를 열어 두고 재사용)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_MB", "64")) * 1024 * 1024
+
+_local = threading.local()
+
+def _open_connection(db_name):
+    # 연결을 닫지 않으므로 sqlite3 기본 문장 캐시(128개)에 준비된 SQL 이 계속 남아 재사용됨
+    conn = sqlite3.connect(db_name, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    # WAL: 쓰기 중에도 읽기가 막히지 않음 (DB 파일에 기록되는 영구 설정)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # WAL 에서는 NORMAL 로도 손상 없이 안전, 커밋마다 fsync 하지 않음
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    return conn
+
+def get_connection():
+    """
+    현재 스레드 전용 연결을 반환합니다. (처음 호출 시 열고 이후 재사용)
+    쓰기 함수는 `with conn:` 으로 감싸 예외 시 트랜잭션이 열린 채 남지 않게 합니다.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(DB_NAME)
+    if conn is None:
+        conn = conns[DB_NAME] = _open_connection(DB_NAME)
+    return conn
+
+def close_connection():
+    """현재 스레드의 연결을 닫습니다."""
+    conns = getattr(_local, "conns", None) or {}
+    conn = conns.pop(DB_NAME, None)
+    if conn is not None:
+        conn.close()
+
+def _add_column_if_missing(cursor, table, column, decl):
+    """이전 버전에서 만든 DB 에 새 컬럼 추가"""
+    columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
 def init_db():
     """데이터베이스 및 테이블 초기화"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # 1. 사용자 복용 약물 테이블
@@ -16,9 +62,13 @@ def init_db():
             drug_name TEXT NOT NULL,
             item_seq TEXT,
             source_mode TEXT,
-            reg_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            reg_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            job_id TEXT
         )
     ''')
+    # 비동기 작업으로 등록된 약은 job_id 로 묶음 (작업이 재실행돼도 중복 등록 방지)
+    _add_column_if_missing(cursor, "user_drugs", "job_id", "TEXT")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_drugs_job ON user_drugs (job_id)')
     
     # 2. 약물 상세 정보 캐시 테이블 (매번 API 호출 방지 및 속도 향상)
     cursor.execute('''
@@ -30,29 +80,251 @@ def init_db():
         )
     ''')
     
+    # 3. 비동기 이미지 분석 작업 테이블 (서버 재시작 후에도 이어서 처리)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params TEXT,
+            payload BLOB,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            owner TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    _add_column_if_missing(cursor, "jobs", "owner", "TEXT")
+    _add_column_if_missing(cursor, "jobs", "lease_until", "REAL")
+    _add_column_if_missing(cursor, "jobs", "attempts", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+    
     conn.commit()
-    conn.close()
     print("✅ 통합 DB 및 테이블 초기화 완료")
 
 # --- 약물 등록 관련 함수 ---
 def register_user_drug(user_id, drug_name, item_seq=None, mode="unknown"):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO user_drugs (user_id, drug_name, item_seq, source_mode)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, drug_name, item_seq, mode))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO user_drugs (user_id, drug_name, item_seq, source_mode)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, drug_name, item_seq, mode))
+
+def register_user_drugs(user_id, drugs, mode="unknown", job_id=None):
+    """
+    여러 약을 한 트랜잭션으로 등록합니다. 하나라도 실패하면 전부 롤백됩니다.
+
+    Args:
+        drugs (list): [drug_name, ...] 또는 [(drug_name, item_seq, mode), ...]
+        job_id (str): 비동기 작업에서 호출한 경우 작업 id. 이미 이 작업으로 등록된 행이 있으면
+            다시 넣지 않습니다. (작업이 커밋 직후 중단되어 재실행된 경우)
+    Returns:
+        등록한 행 수 (이미 등록된 작업이면 기존 행 수)
+    """
+    rows = []
+    for drug in drugs:
+        if isinstance(drug, str):
+            rows.append((user_id, drug, None, mode, job_id))
+        else:
+            name, item_seq, drug_mode = (tuple(drug) + (None, None))[:3]
+            rows.append((user_id, name, item_seq, drug_mode or mode, job_id))
+    if not rows:
+        return 0
+
+    conn = get_connection()
+    try:
+        with conn:  # 정상 종료 시 commit 1회, 예외 시 rollback
+            if job_id is not None:
+                existing = conn.execute('SELECT COUNT(*) FROM user_drugs WHERE job_id = ?', (job_id,)).fetchone()[0]
+                if existing:
+                    return existing
+            conn.executemany('''
+                INSERT INTO user_drugs (user_id, drug_name, item_seq, source_mode, job_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+    except sqlite3.Error as e:
+        print(f"⚠️ 약물 {len(rows)}건 일괄 등록 실패, 전체 롤백: {e}")
+        raise
+    return len(rows)
 
 # --- 복용 약물 불러오기 (음식 분석용) ---
 def get_user_drug_list(user_id):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT drug_name FROM user_drugs WHERE user_id = ?', (user_id,))
     drugs = [row[0] for row in cursor.fetchall()]
-    conn.close()
     return ", ".join(drugs)
 
+# --- 복용 약물 전체 조회 (상호작용 분석용) ---
+def get_user_drugs(user_id):
+    """중복을 제거한 (drug_name, item_seq) 목록"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT drug_name, item_seq FROM user_drugs WHERE user_id = ?', (user_id,))
+    rows = cursor.fetchall()
+    return rows
+
+# --- 약물 리포트 캐시 (drug_cache) ---
+def get_cached_report(item_seq):
+    """
+    캐시된 리포트를 조회합니다.
+    Returns:
+        (report dict, last_updated epoch 초) 또는 None
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT full_report, CAST(strftime('%s', last_updated) AS INTEGER)
+        FROM drug_cache WHERE item_seq = ?
+    ''', (str(item_seq),))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return json.loads(row[0]), row[1]
+
+def save_cached_report(item_seq, item_name, report):
+    """리포트를 캐시에 저장합니다. (같은 item_seq 는 덮어쓰고 last_updated 갱신)"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO drug_cache (item_seq, item_name, full_report, last_updated)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(item_seq) DO UPDATE SET
+                item_name = excluded.item_name,
+                full_report = excluded.full_report,
+                last_updated = CURRENT_TIMESTAMP
+        ''', (str(item_seq), item_name, json.dumps(report, ensure_ascii=False)))
+
+def iter_cached_reports():
+    """drug_cache 의 모든 (item_seq, item_name, report) 를 순회합니다."""
+    conn = get_connection()
+    for item_seq, item_name, full_report in conn.execute('SELECT item_seq, item_name, full_report FROM drug_cache'):
+        yield item_seq, item_name, json.loads(full_report)
+
+def get_expiring_reports(updated_before, limit=50):
+    """
+    last_updated 가 updated_before(epoch 초) 이전인 캐시 항목을 오래된 순으로 반환합니다.
+    Returns:
+        [(item_seq, item_name), ...]
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT item_seq, item_name FROM drug_cache
+        WHERE CAST(strftime('%s', last_updated) AS INTEGER) < ?
+        ORDER BY last_updated ASC
+        LIMIT ?
+    ''', (int(updated_before), limit))
+    rows = cursor.fetchall()
+    return rows
+
+# --- 비동기 작업 (jobs) ---
+def create_job(job_id, kind, params, payload):
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO jobs (job_id, kind, status, params, payload, created_at, updated_at)
+            VALUES (?, ?, 'queued', ?, ?, ?, ?)
+        ''', (job_id, kind, json.dumps(params, ensure_ascii=False), payload, now, now))
+
+def update_job(job_id, status, result=None, error=None, owner=None):
+    """
+    작업 상태 갱신. 끝난 작업(done/failed)은 이미지 payload 를 비웁니다.
+    owner 를 주면 그 워커가 점유 중인 작업일 때만 갱신하고, 갱신 여부를 반환합니다.
+    """
+    finished = status in ("done", "failed")
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?,
+                payload = CASE WHEN ? THEN NULL ELSE payload END
+            WHERE job_id = ? AND (? IS NULL OR owner = ?)
+        ''', (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+              error, time.time(), finished, job_id, owner, owner))
+        updated = cursor.rowcount == 1
+    return updated
+
+def get_job(job_id):
+    """작업 상태 조회 (payload 제외). 없으면 None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT job_id, kind, status, result, error, created_at, updated_at
+        FROM jobs WHERE job_id = ?
+    ''', (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        "job_id": row[0], "kind": row[1], "status": row[2],
+        "result": json.loads(row[3]) if row[3] else None, "error": row[4],
+        "created_at": row[5], "updated_at": row[6],
+    }
+
+def claim_job(job_id, owner, lease_seconds, max_attempts):
+    """
+    작업을 원자적으로 점유합니다. 대기 중(queued)이거나, 실행 중이지만 점유 기한(lease)이 지난 작업만
+    점유할 수 있으므로 여러 워커 프로세스가 같은 작업을 동시에 실행하지 않습니다.
+    Returns:
+        점유에 성공하면 (kind, params, payload), 아니면 None
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+            WHERE job_id = ? AND attempts < ?
+              AND (status = 'queued' OR (status = 'running' AND lease_until < ?))
+        ''', (owner, now + lease_seconds, now, job_id, max_attempts, now))
+        if cursor.rowcount != 1:
+            return None
+        cursor.execute('SELECT kind, params, payload FROM jobs WHERE job_id = ?', (job_id,))
+        row = cursor.fetchone()
+    return row[0], json.loads(row[1]) if row[1] else {}, row[2]
+
+def get_claimable_jobs():
+    """점유할 수 있는 작업 id 목록 (생성 순): 대기 중이거나 점유 기한이 지난 실행 중 작업"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT job_id FROM jobs
+        WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+        ORDER BY created_at
+    ''', (time.time(),))
+    rows = [row[0] for row in cursor.fetchall()]
+    return rows
+
+def fail_exhausted_jobs(max_attempts):
+    """재시도 횟수를 다 쓰고도 끝나지 않은(매번 중단된) 작업을 실패 처리합니다. 처리 건수 반환"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = 'failed', error = '작업이 반복해서 중단되어 실패 처리되었습니다.',
+                payload = NULL, updated_at = ?
+            WHERE status IN ('queued', 'running') AND attempts >= ? AND (lease_until IS NULL OR lease_until < ?)
+        ''', (time.time(), max_attempts, time.time()))
+        failed = cursor.rowcount
+    return failed
+
+def delete_finished_jobs(finished_before):
+    """finished_before(epoch 초) 이전에 끝난 작업 삭제. 삭제 건수 반환"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (finished_before,))
+        deleted = cursor.rowcount
+    return deleted
+
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
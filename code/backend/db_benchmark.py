@@ -0,0 +1,124 @@
+"""
+database.py 호출당 오버헤드 마이크로 벤치마크
+
+기존 방식(호출마다 sqlite3.connect + 기본 rollback journal + close)과
+현재 방식(스레드별 재사용 연결 + WAL + synchronous=NORMAL)을 임시 DB 파일에서 비교합니다.
+
+사용법:
+    python db_benchmark.py --calls 2000 --threads 8
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS user_drugs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        drug_name TEXT NOT NULL,
+        item_seq TEXT,
+        source_mode TEXT,
+        reg_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+# 기존 database.py 와 같은 방식 (호출마다 연결을 열고 닫음)
+def _legacy_register(db_name, user_id, drug_name):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO user_drugs (user_id, drug_name, item_seq, source_mode)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, drug_name, None, "benchmark"))
+    conn.commit()
+    conn.close()
+
+def _legacy_list(db_name, user_id):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute('SELECT drug_name FROM user_drugs WHERE user_id = ?', (user_id,))
+    drugs = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return ", ".join(drugs)
+
+
+def _per_call_us(func, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+
+def _concurrent(func, calls, threads):
+    """스레드 여러 개가 쓰기/읽기를 섞어 호출. (총 소요 시간, 잠금 오류 수)"""
+    errors = []
+
+    def worker(offset):
+        for i in range(calls // threads):
+            try:
+                func(offset * calls + i)
+            except sqlite3.OperationalError as e:  # database is locked
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - started, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="database.py 연결 관리 벤치마크")
+    parser.add_argument("--calls", type=int, default=2000, help="측정할 호출 수")
+    parser.add_argument("--threads", type=int, default=8, help="동시 실행 스레드 수")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="db_benchmark_")
+    legacy_db = os.path.join(workdir, "legacy.db")
+    pooled_db = os.path.join(workdir, "pooled.db")
+
+    conn = sqlite3.connect(legacy_db)
+    conn.execute(_SCHEMA)
+    conn.commit()
+    conn.close()
+
+    database.DB_NAME = pooled_db
+    database.init_db()
+
+    scenarios = {
+        "register (1건 INSERT + 커밋)": (
+            lambda i: _legacy_register(legacy_db, "bench", f"drug{i}"),
+            lambda i: database.register_user_drug("bench", f"drug{i}", mode="benchmark"),
+        ),
+        "get_user_drug_list (조회)": (
+            lambda i: _legacy_list(legacy_db, f"user{i % 50}"),
+            lambda i: database.get_user_drug_list(f"user{i % 50}"),
+        ),
+    }
+
+    print(f"\n📊 호출당 평균 시간 ({args.calls}회, 단일 스레드)")
+    for name, (legacy, pooled) in scenarios.items():
+        before = _per_call_us(legacy, args.calls)
+        after = _per_call_us(pooled, args.calls)
+        print(f"   {name:32s} 기존 {before:9.1f}µs -> 현재 {after:9.1f}µs ({before / after:.1f}배)")
+
+    def mixed(func_register, func_list):
+        return lambda i: func_register(i) if i % 2 else func_list(i)
+
+    print(f"\n📊 동시 등록 + 조회 ({args.calls}회, 스레드 {args.threads}개)")
+    before, before_err = _concurrent(mixed(*[s[0] for s in scenarios.values()]), args.calls, args.threads)
+    after, after_err = _concurrent(mixed(*[s[1] for s in scenarios.values()]), args.calls, args.threads)
+    print(f"   기존 {before:.2f}초 (잠금 오류 {before_err}건) -> 현재 {after:.2f}초 (잠금 오류 {after_err}건)")
+    print(f"\n임시 DB: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
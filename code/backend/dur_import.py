@@ -0,0 +1,47 @@
+"""
+오프라인 DUR 저장소 관리 스크립트
+
+사용법:
+    python dur_import.py import ./dur_data --version 2026-10
+    python dur_import.py refresh      # 마지막으로 적재한 디렉토리에서 다시 적재
+    python dur_import.py version      # 현재 저장소 버전 확인
+
+서버에서 저장소를 사용하려면 DRUG_REPORT_SOURCE=local (또는 local_first) 로 설정합니다.
+"""
+import argparse
+import json
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from services import dur_local
+
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 DUR 저장소 관리")
+    parser.add_argument("--db", type=str, default=None, help="저장소 파일 경로 (기본 DUR_LOCAL_DB)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="데이터 디렉토리에서 저장소를 새로 적재")
+    p_import.add_argument("source_dir", type=str, help="카테고리별 CSV/JSON 파일이 있는 디렉토리")
+    p_import.add_argument("--version", type=str, default=None, help="버전 스탬프 (기본: 적재 시각 + 파일 해시)")
+
+    sub.add_parser("refresh", help="마지막 적재 디렉토리에서 다시 적재")
+    sub.add_parser("version", help="현재 저장소 버전 출력")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        dur_local.import_bulk(args.source_dir, db_path=args.db, version=args.version)
+    elif args.command == "refresh":
+        dur_local.refresh(db_path=args.db)
+    elif args.command == "version":
+        info = dur_local.get_version(args.db)
+        if info is None:
+            print("⚠️ 로컬 DUR 저장소가 없습니다.")
+        else:
+            print(json.dumps(info, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,51 @@
 import os
 import json
-import shutil
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import asyncio
+import hashlib
+from typing import List
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 load_dotenv()
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.formparsers import MultiPartParser
 # 디버깅
 import traceback
 import logging
+import threading
+import time
+
+# 서비스 모듈의 logger (전처리 단계별 시간, Gemini 토큰 사용량, 식별 경로 등) 출력 설정.
+# uvicorn 은 자기 logger 만 설정하므로 루트 logger 를 직접 설정하지 않으면 INFO 로그가 보이지 않음
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
 
 # 분리된 서비스 모듈 임포트
-from services.img_vision import analyze_health_image
-from services.drug_api import get_full_drug_report
-from services.ai_pharmacist import generate_ai_advice
+from services.img_vision import analyze_health_image, vision_cache_stats
+from services.drug_api import (
+    get_full_drug_report, close_http_client, report_cache_stats,
+    start_background_refresher, stop_background_refresher, refresher_stats,
+    single_flight_stats, prewarm_reports, prewarm_stats, hedge_stats,
+)
+from services.ai_pharmacist import (
+    generate_ai_advice, stream_ai_advice, get_cached_advice, store_advice, advice_cache_stats,
+)
+from services import dur_local
+from services.gemini_client import warm_up as warm_up_gemini, registry_stats, usage_stats
+from services.image_preprocess import preprocess_stats
+from services.pill_detector import identify_pill, router_stats
+from services.food_rules import food_rules_stats
+from services.llm_scheduler import scheduler as llm_scheduler, CircuitOpenError, PRIORITY_BACKGROUND
+from services.blocking_pool import run_blocking, pool_stats, shutdown as shutdown_blocking_pool
+from services.interaction_engine import check_drug_set, engine_stats, start_index_build
+from services.job_queue import job_queue
 
 # [추가] DB 관리 함수 임포트
 # [추가] DB 관리 함수 임포트
-from database import register_user_drug, get_user_drug_list, init_db
+from database import register_user_drugs, get_user_drug_list, get_user_drugs, init_db
 
 # config.py에서 URL 설정 로드
 from config import *
@@ -33,7 +61,42 @@ app = FastAPI(
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # 재시작 전에 끝나지 않은 분석 작업을 이어서 처리
+    job_queue.recover()
+    start_background_refresher()
+    # 병용금기 인덱스를 미리 구축 (첫 /drug-interactions 요청이 전체 스캔을 기다리지 않도록)
+    start_index_build()
+    if GEMINI_WARMUP_ON_STARTUP:
+        # 연결 수립을 기다리지 않고 바로 요청을 받음
+        threading.Thread(target=warm_up_gemini, name="gemini-warmup", daemon=True).start()
+    if PREWARM_ON_STARTUP:
+        # 기다리지 않음: 프리웜이 도는 동안에도 요청을 받음
+        prewarm_reports(YOLO_LABEL_MAP, wait=False)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_background_refresher()
+    close_http_client()
+    job_queue.shutdown()
+    shutdown_blocking_pool()
 
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """
+    멀티파트 본문을 파싱(스풀)하기 전에 Content-Length 로 너무 큰 업로드를 거절합니다.
+    Content-Length 가 없는 chunked 요청은 파싱 후 _read_upload 의 파일별 제한만 적용됩니다.
+    """
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        limit = _request_size_limit(request.url.path)
+        if int(content_length) > limit:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"요청이 너무 큽니다. (최대 {limit // (1024 * 1024)}MB)"},
+            )
+    return await call_next(request)
+
+# 위 미들웨어보다 나중에 추가해 바깥에 둠 (413 응답에도 CORS 헤더가 붙도록)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -54,6 +117,7 @@ class ConsultationRequest(BaseModel):
     class_id: int
     user_profile: UserProfile
     options: list[str]
+    bypass_cache: bool = False   # True 면 캐시된 상담을 쓰지 않고 새로 생성
 
 # =========================================================
 # 3. 매핑 파일 로드
@@ -61,6 +125,28 @@ class ConsultationRequest(BaseModel):
 MAPPING_FILE = "drug_mapping.json"
 YOLO_LABEL_MAP = {}
 
+# 서버 시작 시 매핑된 모든 약의 리포트를 백그라운드로 미리 캐시
+PREWARM_ON_STARTUP = os.getenv("PREWARM_ON_STARTUP", "False").lower() == "true"
+# 서버 시작 시 Gemini 클라이언트 초기화 + 연결 워밍업
+GEMINI_WARMUP_ON_STARTUP = os.getenv("GEMINI_WARMUP_ON_STARTUP", "True").lower() == "true"
+# 여러 장 일괄 등록: 한 요청당 최대 파일 수 / 동시에 분석할 파일 수
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# 업로드 이미지 최대 크기 (Content-Length 로 파싱 전에, 파일별로는 복사 중에 413)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# 멀티파트 경계/헤더/폼 필드 몫으로 허용하는 여유분
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Starlette 는 업로드 파일을 SpooledTemporaryFile 에 받는데 기본 1MB 를 넘으면 디스크로 넘김.
+# 제한 이내의 이미지는 메모리에만 머물도록 스풀 크기를 업로드 제한에 맞춤
+MultiPartParser.spool_max_size = max(MultiPartParser.spool_max_size, MAX_UPLOAD_BYTES)
+
+def _request_size_limit(path):
+    """경로별 요청 본문 최대 크기 (여러 장 일괄 등록은 파일 수만큼)"""
+    if path == "/register-drug-images":
+        return BATCH_MAX_FILES * (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
+    return MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
 if os.path.exists(MAPPING_FILE):
     with open(MAPPING_FILE, "r", encoding="utf-8") as f:
         YOLO_LABEL_MAP = json.load(f)
@@ -76,38 +162,93 @@ else:
 def health_check():
     return {"status": "ok", "message": "AI 약사 서버 가동 중"}
 
+@app.get("/metrics")
+def metrics():
+    """캐시 등 내부 상태 지표"""
+    return {
+        "drug_report_cache": report_cache_stats(),
+        "drug_report_refresher": refresher_stats(),
+        "drug_api_single_flight": single_flight_stats(),
+        "drug_report_prewarm": prewarm_stats(),
+        "drug_api_hedging": hedge_stats(),
+        "dur_local": dur_local.get_version(),
+        "interaction_engine": engine_stats(),
+        "blocking_pool": pool_stats(),
+        "gemini_clients": registry_stats(),
+        "image_preprocess": preprocess_stats(),
+        "vision_cache": vision_cache_stats(),
+        "advice_cache": advice_cache_stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_token_usage": usage_stats(),
+        "pill_router": router_stats(),
+        "food_rules": food_rules_stats(),
+        "job_queue": job_queue.stats(),
+    }
+
+async def _read_upload(file: UploadFile):
+    """
+    파싱된 업로드를 바이트로 읽으면서 파일별 크기 제한과 sha256 해시를 함께 처리합니다.
+    본문은 이미 Starlette 가 스풀 파일에 받아 둔 상태이므로, 큰 요청은 limit_upload_size 에서
+    파싱 전에 거절되고 스풀은 MAX_UPLOAD_BYTES 까지 메모리에 머뭅니다. (임시 파일명 기반 저장 없음)
+    Returns:
+        (이미지 바이트, sha256 hex)
+    """
+    # 파트 크기를 알고 있으면 복사하기 전에 거절
+    if getattr(file, "size", None) and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"이미지는 최대 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB까지 업로드할 수 있습니다.")
+    buffer = bytearray()
+    digest = hashlib.sha256()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"이미지는 최대 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB까지 업로드할 수 있습니다.")
+        buffer += chunk
+        digest.update(chunk)
+    return bytes(buffer), digest.hexdigest()
+
+# 아래 블로킹 작업들은 async 엔드포인트에서 run_blocking 으로 풀에 넘겨 실행합니다.
+
+def _register_pills(detected_pills, mode, job_id=None):
+    # 우선 user_id는 "test_user"로 고정합니다.
+    # 분석 1건의 약 전체를 한 트랜잭션(커밋 1회)으로 저장, 하나라도 실패하면 전부 롤백
+    registered = register_user_drugs("test_user", detected_pills, mode, job_id=job_id)
+    print(f"💾 DB 저장 완료: {registered}건 ({', '.join(map(str, detected_pills))})")
+    return registered
+
+def _extract_pills(analysis_result):
+    """Gemini 분석 결과에서 약 이름 리스트를 꺼냅니다."""
+    # mode="prescription" -> medications list of objects
+    # mode="hospital_prescription" -> prescribed_drugs list of objects
+    detected_pills = []
+    if "medications" in analysis_result:
+        detected_pills = [m.get("name", m.get("drug_name", "Unknown")) for m in analysis_result["medications"]]
+    elif "prescribed_drugs" in analysis_result:
+        detected_pills = [m.get("name", m.get("drug_name", "Unknown")) for m in analysis_result["prescribed_drugs"]]
+
+    # Fallback if just a list of strings
+    if not detected_pills:
+        detected_pills = analysis_result.get("detected_pills", [])
+    return detected_pills
+
 @app.post("/register-drug-image")
 async def register_drug_by_image(file: UploadFile = File(...), mode: str = "prescription"):
     """
     [기능 1] 사진을 찍어 약품 등록 + DB 자동 저장
     """
-    temp_path = f"temp_{file.filename}"
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    raw, digest = await _read_upload(file)
     
     try:
         # 1. 이미지 분석 (Gemini Vision)
-        analysis_result = analyze_health_image(temp_path, mode=mode)
+        analysis_result = await run_blocking(analyze_health_image, raw, mode=mode, digest=digest)
         
         # 2. [DB 이식] 분석된 약물 리스트를 DB에 저장
         # Gemini가 보낸 결과(analysis_result) 내에 약물 이름 리스트가 있다고 가정합니다.
-        # mode="prescription" -> medications list of objects
-        # mode="hospital_prescription" -> prescribed_drugs list of objects
-        detected_pills = []
-        if "medications" in analysis_result:
-            detected_pills = [m.get("name", m.get("drug_name", "Unknown")) for m in analysis_result["medications"]]
-        elif "prescribed_drugs" in analysis_result:
-             detected_pills = [m.get("name", m.get("drug_name", "Unknown")) for m in analysis_result["prescribed_drugs"]]
-        
-        # Fallback if just a list of strings
-        if not detected_pills:
-             detected_pills = analysis_result.get("detected_pills", [])
+        detected_pills = _extract_pills(analysis_result)
         
-        # 만약 리스트가 있다면 하나씩 DB에 저장
-        for pill_name in detected_pills:
-            # 우선 user_id는 "test_user"로 고정합니다.
-            register_user_drug(user_id="test_user", drug_name=pill_name, mode=mode)
-            print(f"💾 DB 저장 완료: {pill_name}")
+        # 만약 리스트가 있다면 한 번에 DB에 저장
+        await run_blocking(_register_pills, detected_pills, mode)
 
         return {
             "status": "success",
@@ -125,9 +266,63 @@ async def register_drug_by_image(file: UploadFile = File(...), mode: str = "pres
                  log_file.write("Analysis Result: Not available (failed before analysis)\n")
         
         raise HTTPException(status_code=500, detail=f"이미지 분석 및 저장 실패: {str(e)}")
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+
+@app.post("/register-drug-images")
+async def register_drug_by_images(files: List[UploadFile] = File(...), mode: str = "prescription", modes: str = ""):
+    """
+    [기능 1-2] 약봉투/처방전 여러 장 일괄 등록
+
+    파일들을 동시에(BATCH_CONCURRENCY 개씩) 분석하고, 검출된 약 전체를 한 트랜잭션으로 저장합니다.
+    한 장이 실패해도 나머지는 계속 처리하며, 파일별 결과와 소요 시간을 반환합니다.
+    modes 에 "prescription,hospital_prescription,..." 처럼 파일 순서대로 모드를 줄 수 있습니다.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"한 번에 최대 {BATCH_MAX_FILES}장까지 등록할 수 있습니다.")
+    file_modes = [m.strip() for m in modes.split(",")] if modes else []
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    batch_started = time.perf_counter()
+
+    async def analyze_one(index, upload):
+        file_mode = (file_modes[index] if index < len(file_modes) else "") or mode
+        entry = {"index": index, "filename": upload.filename, "mode": file_mode}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                raw, digest = await _read_upload(upload)
+                analysis_result = await run_blocking(analyze_health_image, raw, mode=file_mode, digest=digest)
+                if "error" in analysis_result:
+                    entry.update(status="error", error=analysis_result["error"], detected_pills=[])
+                else:
+                    entry.update(status="success", detected_pills=_extract_pills(analysis_result),
+                                 detected_data=analysis_result)
+            except HTTPException as e:
+                entry.update(status="error", error=e.detail, detected_pills=[])
+            except Exception as e:
+                logging.exception("일괄 등록 중 %s 분석 실패", upload.filename)
+                entry.update(status="error", error=str(e), detected_pills=[])
+            entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return entry
+
+    results = await asyncio.gather(*(analyze_one(i, f) for i, f in enumerate(files)))
+
+    # 검출된 약 전체를 한 번에 저장 (하나라도 실패하면 전부 롤백)
+    drugs = [(name, None, entry["mode"]) for entry in results for name in entry["detected_pills"]]
+    try:
+        registered = await run_blocking(register_user_drugs, "test_user", drugs, mode)
+    except Exception as e:
+        logging.exception("일괄 등록 DB 저장 실패")
+        raise HTTPException(status_code=500, detail=f"DB 저장 실패 (전체 롤백): {str(e)}")
+    print(f"💾 DB 일괄 저장 완료: {registered}건")
+
+    failed = sum(1 for entry in results if entry["status"] != "success")
+    return {
+        "status": "success" if not failed else ("partial" if failed < len(results) else "error"),
+        "message": f"{len(results)}장 중 {len(results) - failed}장 분석, {registered}개의 약물이 DB에 등록되었습니다.",
+        "registered": registered,
+        "elapsed_ms": round((time.perf_counter() - batch_started) * 1000, 1),
+        "results": results,
+    }
 
 @app.post("/consult")
 def consult_drug(request: ConsultationRequest):
@@ -140,43 +335,204 @@ def consult_drug(request: ConsultationRequest):
     if not drug_meta:
         raise HTTPException(status_code=404, detail="매핑 정보를 찾을 수 없습니다.")
 
+    if not request.bypass_cache:
+        cached_advice = get_cached_advice(request)
+        if cached_advice is not None:
+            return {
+                "drug_name": drug_meta['name'],
+                "selected_options": request.options,
+                "advice": cached_advice,
+                "cached": True
+            }
+
     drug_report = get_full_drug_report(drug_meta['code'], drug_meta['name'])
     
     try:
         advice = generate_ai_advice(drug_report, request)
+        store_advice(request, drug_report, advice)
         return {
             "drug_name": drug_meta['name'],
             "selected_options": request.options,
-            "advice": advice
+            "advice": advice,
+            "cached": False
         }
     
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # 디벅깅
         logging.error("❌ /consult crashed: %s", e)
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"상담 생성 오류: {str(e)}")
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/consult/stream")
+def consult_drug_stream(request: ConsultationRequest):
+    """
+    [기능 2-1] /consult 의 Server-Sent Events 스트리밍 버전
+    이벤트 순서: meta(약 이름, 선택 항목) -> chunk(상담 문장 조각, 여러 번) -> done(요약)
+    """
+    str_id = str(request.class_id)
+    drug_meta = YOLO_LABEL_MAP.get(str_id)
+    
+    if not drug_meta:
+        raise HTTPException(status_code=404, detail="매핑 정보를 찾을 수 없습니다.")
+
+    def event_stream():
+        started = time.perf_counter()
+        # 리포트 조회 전에 먼저 보내 채팅 화면이 바로 반응하도록 함
+        yield _sse("meta", {"drug_name": drug_meta['name'], "selected_options": request.options})
+
+        cached_advice = None if request.bypass_cache else get_cached_advice(request)
+        if cached_advice is not None:
+            yield _sse("chunk", {"text": cached_advice})
+            yield _sse("done", {
+                "drug_name": drug_meta['name'],
+                "selected_options": request.options,
+                "advice": cached_advice,
+                "missing": [],
+                "cached": True,
+                "ttft_ms": round((time.perf_counter() - started) * 1000),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            })
+            return
+
+        first_token_ms = None
+        parts = []
+        try:
+            drug_report = get_full_drug_report(drug_meta['code'], drug_meta['name'])
+            for text in stream_ai_advice(drug_report, request):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000)
+                parts.append(text)
+                yield _sse("chunk", {"text": text})
+
+            advice = "".join(parts)
+            store_advice(request, drug_report, advice)
+            yield _sse("done", {
+                "drug_name": drug_meta['name'],
+                "selected_options": request.options,
+                "advice": advice,
+                "missing": drug_report.get("missing", []),
+                "cached": False,
+                "ttft_ms": first_token_ms,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            })
+        except Exception as e:
+            logging.error("❌ /consult/stream crashed: %s", e)
+            logging.error(traceback.format_exc())
+            yield _sse("error", {"detail": f"상담 생성 오류: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/analyze-food-interaction")
 async def analyze_food(file: UploadFile = File(...)):
     """
     [기능 3] 음식 상호작용 분석 (DB에서 내 약 목록 불러오기)
     """
-    temp_path = f"temp_{file.filename}"
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    raw, digest = await _read_upload(file)
     
+    # 1. [DB 이식] DB에서 이전에 등록한 약 리스트를 싹 가져옵니다.
+    # 등록된 약이 없으면 빈 문자열 -> 규칙 판정이 "확인하지 않음"(no_drugs)으로 응답
+    current_pill_list = await run_blocking(get_user_drug_list, user_id="test_user")
+    
+    print(f"🔍 DB에서 불러온 약 목록: {current_pill_list or '없음'}")
+
+    # 2. 음식 사진과 함께 Gemini에게 분석 요청
+    result = await run_blocking(analyze_health_image, raw, mode="food", current_pill=current_pill_list, digest=digest)
+    return result
+
+@app.post("/identify-pill")
+async def identify_pill_image(file: UploadFile = File(...)):
+    """
+    [기능 5] 알약 사진 식별 (로컬 RT-DETR 우선, 신뢰도가 낮을 때만 Gemini)
+    """
+    raw, _ = await _read_upload(file)
+    # 클래스 매핑은 탐지기 가중치와 함께 배포되는 파일(PILL_MAPPING_PATH)을 사용
+    result = await run_blocking(identify_pill, raw)
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=f"알약 식별 실패: {result['error']}")
+    return result
+
+# =========================================================
+# 5. 비동기 작업 (job_id 즉시 반환 -> 폴링 / WebSocket 으로 결과 수신)
+# =========================================================
+def _register_image_job(job_id, raw, params):
+    mode = params.get("mode", "prescription")
+    # 큐에 쌓인 작업은 백그라운드 레인: 화면 앞에서 기다리는 업로드/상담보다 뒤로
+    analysis_result = analyze_health_image(raw, mode=mode, priority=PRIORITY_BACKGROUND, digest=params.get("sha256"))
+    if "error" in analysis_result:
+        raise RuntimeError(analysis_result["error"])
+    detected_pills = _extract_pills(analysis_result)
+    # job_id 로 묶어 저장: 커밋 직후 중단되어 재실행돼도 같은 약이 두 번 등록되지 않음
+    _register_pills(detected_pills, mode, job_id=job_id)
+    return {
+        "status": "success",
+        "message": f"{len(detected_pills)}개의 약물이 DB에 등록되었습니다.",
+        "detected_data": analysis_result,
+    }
+
+def _food_job(job_id, raw, params):
+    current_pill_list = get_user_drug_list(user_id="test_user")
+    result = analyze_health_image(
+        raw, mode="food", current_pill=current_pill_list, priority=PRIORITY_BACKGROUND, digest=params.get("sha256"),
+    )
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+job_queue.register_handler("register_drug_image", _register_image_job)
+job_queue.register_handler("analyze_food_interaction", _food_job)
+
+async def _submit_job(kind, file, params):
+    raw, digest = await _read_upload(file)
+    job_id = await run_blocking(job_queue.submit, kind, raw, {**params, "filename": file.filename, "sha256": digest})
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/jobs/register-drug-image", status_code=202)
+async def submit_register_drug_job(file: UploadFile = File(...), mode: str = "prescription"):
+    """[기능 1 비동기] 약 등록 분석 작업 제출 -> job_id"""
+    return await _submit_job("register_drug_image", file, {"mode": mode})
+
+@app.post("/jobs/analyze-food-interaction", status_code=202)
+async def submit_food_job(file: UploadFile = File(...)):
+    """[기능 3 비동기] 음식 상호작용 분석 작업 제출 -> job_id"""
+    return await _submit_job("analyze_food_interaction", file, {})
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """작업 상태 폴링 (queued / running / done / failed, 끝나면 result 또는 error 포함)"""
+    job = await run_blocking(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job
+
+@app.websocket("/jobs/{job_id}/ws")
+async def watch_job(websocket: WebSocket, job_id: str):
+    """작업 상태가 바뀔 때마다 push, 끝나면 연결 종료"""
+    await websocket.accept()
     try:
-        # 1. [DB 이식] DB에서 이전에 등록한 약 리스트를 싹 가져옵니다.
-        current_pill_list = get_user_drug_list(user_id="test_user")
-        
-        if not current_pill_list:
-            current_pill_list = "현재 복용 중인 약 정보 없음 (상담 시 참고만 하세요)"
-        
-        print(f"🔍 DB에서 불러온 약 목록: {current_pill_list}")
-
-        # 2. 음식 사진과 함께 Gemini에게 분석 요청
-        result = analyze_health_image(temp_path, mode="food", current_pill=current_pill_list)
-        return result
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
\ No newline at end of file
+        found = False
+        async for job in job_queue.watch(job_id):
+            found = True
+            await websocket.send_json(job)
+        if not found:
+            await websocket.send_json({"job_id": job_id, "status": "not_found"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/drug-interactions")
+def check_drug_interactions(user_id: str = "test_user"):
+    """
+    [기능 4] 등록된 복용 약 전체의 병용금기 조합 검사 (LLM 없이 인덱스 대조)
+    """
+    drugs = get_user_drugs(user_id)
+    result = check_drug_set(drugs, label_map=YOLO_LABEL_MAP)
+    return {"user_id": user_id, **result}
@@ -0,0 +1,35 @@
+"""
+drug_mapping.json 의 모든 클래스에 대해 약품 리포트(e약은요 + DUR)를 미리 받아
+drug_cache 에 채웁니다. 배포 직후 첫 사용자가 콜드 캐시를 맞지 않도록 사용합니다.
+
+사용법:
+    python prewarm.py --concurrency 4
+"""
+import argparse
+import json
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import init_db
+from services.drug_api import prewarm_reports, close_http_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="약품 리포트 캐시 프리웜")
+    parser.add_argument("--mapping", type=str, default="drug_mapping.json", help="Drug mapping JSON file")
+    parser.add_argument("--concurrency", type=int, default=None, help="동시에 조회할 약 수")
+    args = parser.parse_args()
+
+    with open(args.mapping, "r", encoding="utf-8") as f:
+        label_map = json.load(f)
+
+    init_db()
+    try:
+        prewarm_reports(label_map, concurrency=args.concurrency)
+    finally:
+        close_http_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,54 @@
-import google.generativeai as genai
+import hashlib
+import json
 import os
+import time
 
-def generate_ai_advice(drug_report, user_req):
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if not GEMINI_API_KEY:
-        # 1) 개발 중이면 그냥 문자열로 반환 (프론트 연결 테스트용)
-        return "⚠️ GEMINI_API_KEY가 설정되지 않아 AI 상담을 생성할 수 없습니다. .env에 GEMINI_API_KEY를 추가하세요."
+from services.gemini_client import get_model, is_configured, choose_prompt_variant, record_usage
+from services.llm_scheduler import scheduler, PRIORITY_INTERACTIVE
+from services.memory_cache import CompressedLRU
+
+NO_API_KEY_MESSAGE = "⚠️ GEMINI_API_KEY가 설정되지 않아 AI 상담을 생성할 수 없습니다. .env에 GEMINI_API_KEY를 추가하세요."
+
+# 상담 결과 캐시: 프롬프트는 (약, 선택 항목 순서, 증상, 연령) 에만 의존
+ADVICE_CACHE_TTL = float(os.getenv("ADVICE_CACHE_TTL_MIN", "360")) * 60
+ADVICE_CACHE_MAX = int(os.getenv("ADVICE_CACHE_MAX", "1024"))
+# 연령을 이 단위(년)로 묶어 캐시 키와 프롬프트에 사용 (1 이면 묶지 않음)
+ADVICE_AGE_BUCKET = max(1, int(os.getenv("ADVICE_AGE_BUCKET", "5")))
+
+_advice_cache = CompressedLRU(
+    "advice",
+    max_entries=ADVICE_CACHE_MAX,
+    max_bytes=8 * 1024 * 1024,
+    ttl=ADVICE_CACHE_TTL,
+)
 
-    genai.configure(api_key=GEMINI_API_KEY)
-    llm_model = genai.GenerativeModel('gemini-2.5-flash')
+def _age_label(age):
+    # 같은 구간의 사용자가 같은 답을 받으므로 프롬프트에도 구간으로 넣음
+    if ADVICE_AGE_BUCKET == 1:
+        return f"{age}세"
+    low = age // ADVICE_AGE_BUCKET * ADVICE_AGE_BUCKET
+    return f"{low}~{low + ADVICE_AGE_BUCKET - 1}세"
 
+def advice_cache_key(user_req):
+    """요청을 정규화한 캐시 키 (옵션 순서는 프롬프트에 영향을 주므로 유지)"""
+    symptom = " ".join(str(user_req.user_profile.symptom).split())
+    payload = [user_req.class_id, list(user_req.options), symptom, _age_label(user_req.user_profile.age)]
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def get_cached_advice(user_req):
+    return _advice_cache.get(advice_cache_key(user_req))
+
+def store_advice(user_req, drug_report, advice):
+    # API 키 미설정 안내문, 부분 리포트 기반 답변은 캐시하지 않음
+    if not is_configured() or not advice or drug_report.get("missing"):
+        return
+    _advice_cache.set(advice_cache_key(user_req), advice)
+
+def advice_cache_stats():
+    return _advice_cache.stats()
+
+def build_advice_prompt(drug_report, user_req, variant="full"):
+    """리포트 중 사용자가 선택한 항목만 골라 상담 프롬프트를 만듭니다. (variant: full / compact)"""
     basic = drug_report.get('basic') or {}
     safety = drug_report.get('safety') or {}
     
@@ -33,6 +72,10 @@ def generate_ai_advice(drug_report, user_req):
                 if items:
                     desc = [str(i.get('PROVISO', i.get('REMARK', '주의'))) for i in items[:1]]
                     safety_info += f"- {category}: {', '.join(desc)}\n"
+            # 조회하지 못한 카테고리(마감 초과, 일부 페이지 누락, 로컬 저장소 미적재)는 '없음'과 구분해 알려줌
+            for category in drug_report.get('missing') or []:
+                if category != "basic":
+                    safety_info += f"- {category}: 데이터를 조회하지 못해 확인하지 못함\n"
             
             atpn = basic.get("atpnQesitm", "정보 없음") # 일반 주의사항 포함
             filtered_context += f"[금기 및 주의사항]:\n{safety_info}\n일반주의: {atpn}\n"
@@ -40,13 +83,22 @@ def generate_ai_advice(drug_report, user_req):
         else:
             filtered_context += f"[{option}]: 해당 항목에 대한 상세 데이터가 부족합니다.\n"
 
+    if variant == "compact":
+        # 토큰 절감용 압축 프롬프트 (A/B 실험)
+        return (
+            f"AI 약사로서 아래 정보만 근거로 '{', '.join(user_req.options)}' 항목만 답하세요. "
+            f"금기사항은 연령·증상 기준 위험을 강조하세요.\n"
+            f"증상: {user_req.user_profile.symptom} / 연령: {_age_label(user_req.user_profile.age)}\n"
+            f"[약품: {basic.get('itemName', '미상')}]\n{filtered_context}"
+        )
+
     # 최종 프롬프트 생성
     prompt = f"""
     당신은 전문 AI 약사입니다. 사용자가 요청한 특정 정보만을 바탕으로 상담하세요.
     
     [사용자 프로필]
     - 증상: {user_req.user_profile.symptom}
-    - 연령: {user_req.user_profile.age}세
+    - 연령: {_age_label(user_req.user_profile.age)}
     
     [선택된 약품 정보: {basic.get('itemName', '미상')}]
     {filtered_context}
@@ -56,6 +108,51 @@ def generate_ai_advice(drug_report, user_req):
     2. 선택하지 않은 정보는 언급을 최소화하세요.
     3. 금기사항이 포함된 경우 사용자의 연령과 증상을 고려해 위험 요소를 강조하세요.
     """
+    return prompt
+
+def generate_ai_advice(drug_report, user_req):
+    if not is_configured():
+        # 1) 개발 중이면 그냥 문자열로 반환 (프론트 연결 테스트용)
+        return NO_API_KEY_MESSAGE
+
+    llm_model = get_model()
+    variant = choose_prompt_variant()
+    prompt = build_advice_prompt(drug_report, user_req, variant)
     
-    response = llm_model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+    started = time.perf_counter()
+    response = scheduler.call(llm_model.generate_content, prompt, priority=PRIORITY_INTERACTIVE)
+    record_usage("advice", response, variant, time.perf_counter() - started)
+    return response.text
+
+def stream_ai_advice(drug_report, user_req):
+    """
+    generate_ai_advice 의 스트리밍 버전. 생성되는 대로 텍스트 조각을 yield 합니다.
+    """
+    if not is_configured():
+        yield NO_API_KEY_MESSAGE
+        return
+
+    llm_model = get_model()
+    variant = choose_prompt_variant()
+    prompt = build_advice_prompt(drug_report, user_req, variant)
+
+    started = time.perf_counter()
+    # 스트림이 끝나거나 닫힐 때까지 스케줄러 슬롯을 점유 (동시 실행 상한, 재시도, 브레이커 적용)
+    last_chunk = None
+    chunks = scheduler.stream(llm_model.generate_content, prompt, stream=True, priority=PRIORITY_INTERACTIVE)
+    try:
+        for chunk in chunks:
+            last_chunk = chunk
+            try:
+                text = chunk.text
+            except ValueError:
+                # 안전 필터 등으로 텍스트 파트가 없는 조각
+                continue
+            if text:
+                yield text
+    finally:
+        # 클라이언트가 중간에 끊어도 슬롯을 바로 반환
+        chunks.close()
+
+    # 마지막 조각의 usage_metadata 에 전체 토큰 수가 담김
+    record_usage("advice_stream", last_chunk, variant, time.perf_counter() - started)
\ No newline at end of file
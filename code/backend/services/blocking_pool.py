@@ -0,0 +1,70 @@
+"""
+블로킹 작업 전용 스레드 풀
+
+async 엔드포인트 안에서 Gemini 호출, 파일 I/O, sqlite 처럼 이벤트 루프를 멈추는
+작업을 크기가 제한된 풀로 넘깁니다. 대기열 길이와 대기 시간을 지표로 남깁니다.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BLOCKING_MAX_WORKERS = int(os.getenv("BLOCKING_MAX_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_MAX_WORKERS, thread_name_prefix="blocking")
+_lock = threading.Lock()
+_recent_waits = deque(maxlen=200)
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "queued": 0,
+    "running": 0,
+    "wait_max": 0.0,
+}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """func(*args, **kwargs) 를 블로킹 풀에서 실행하고 결과를 기다립니다."""
+    enqueued = time.perf_counter()
+    with _lock:
+        _stats["submitted"] += 1
+        _stats["queued"] += 1
+
+    def _task():
+        wait = time.perf_counter() - enqueued
+        with _lock:
+            _stats["queued"] -= 1
+            _stats["running"] += 1
+            _stats["wait_max"] = max(_stats["wait_max"], wait)
+            _recent_waits.append(wait)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with _lock:
+                _stats["failed"] += 1
+            raise
+        finally:
+            with _lock:
+                _stats["running"] -= 1
+                _stats["completed"] += 1
+        return result
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, _task)
+
+
+def pool_stats():
+    with _lock:
+        waits = sorted(_recent_waits)
+        return {
+            **_stats,
+            "max_workers": BLOCKING_MAX_WORKERS,
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+        }
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
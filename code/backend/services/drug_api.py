@@ -1,67 +1,654 @@
-import requests
+import asyncio
+import logging
+import math
 import os
+import threading
+import time
+from collections import deque
+
+import httpx
 from config import * # URL 변수들이 config에 저장되어 있다고 가정
+from database import get_cached_report, save_cached_report, get_expiring_reports
+from services.memory_cache import CompressedLRU
+from services import dur_local
+
+logger = logging.getLogger(__name__)
 
 # 환경 변수 로드
 DATA_GO_KR_KEY = os.getenv("KEY_E_DRUG") or os.getenv("DATA_GO_KR_KEY")
 USE_MOCK_DATA = os.getenv("USE_MOCK_DATA", "True").lower() == "true"
 
-def get_full_drug_report(item_seq, item_name):
+# 리포트 조회 방식
+#   api         : data.go.kr 실시간 호출 (캐시 사용)
+#   local       : 오프라인 DUR 저장소(dur_local)만 사용 - 네트워크 호출 없음
+#   local_first : 저장소에 없는 약만 API 로 조회
+DRUG_REPORT_SOURCE = os.getenv("DRUG_REPORT_SOURCE", "api").lower()
+
+# 공유 커넥션 풀 설정 (keep-alive 로 TLS 핸드셰이크 재사용)
+HTTP_MAX_CONNECTIONS = int(os.getenv("DRUG_API_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("DRUG_API_MAX_KEEPALIVE", "10"))
+
+# 리포트 캐시 유효 시간 (drug_cache 테이블)
+DRUG_CACHE_TTL = float(os.getenv("DRUG_CACHE_TTL_HOURS", "24")) * 3600
+# 만료 후에도 이 시간까지는 기존 리포트를 바로 주고 백그라운드에서 갱신 (stale-while-revalidate)
+DRUG_CACHE_MAX_STALE = float(os.getenv("DRUG_CACHE_MAX_STALE_HOURS", "72")) * 3600
+
+# 백그라운드 갱신 설정
+DRUG_REFRESH_INTERVAL = float(os.getenv("DRUG_REFRESH_INTERVAL_MIN", "30")) * 60
+DRUG_REFRESH_AHEAD = float(os.getenv("DRUG_REFRESH_AHEAD_HOURS", "2")) * 3600  # 만료 이 시간 전부터 미리 갱신
+DRUG_REFRESH_CONCURRENCY = int(os.getenv("DRUG_REFRESH_CONCURRENCY", "2"))
+DRUG_REFRESH_BATCH = int(os.getenv("DRUG_REFRESH_BATCH", "50"))
+
+# 프리웜 동시 실행 수 (약 1건 = 호출 9건)
+DRUG_PREWARM_CONCURRENCY = int(os.getenv("DRUG_PREWARM_CONCURRENCY", "4"))
+
+# drug_cache 앞단의 프로세스 로컬 LRU (워커당 메모리 상한)
+DRUG_LRU_MAX_ENTRIES = int(os.getenv("DRUG_LRU_MAX_ENTRIES", "256"))
+DRUG_LRU_MAX_BYTES = int(float(os.getenv("DRUG_LRU_MAX_MB", "16")) * 1024 * 1024)
+
+# 호출별 타임아웃 (초)
+BASIC_TIMEOUT = 5
+DUR_TIMEOUT = 3
+
+# DUR 페이지 크기 (data.go.kr 허용 최대 numOfRows) 및 카테고리당 최대 페이지 수
+DUR_PAGE_SIZE = int(os.getenv("DUR_PAGE_SIZE", "100"))
+DUR_MAX_PAGES = int(os.getenv("DUR_MAX_PAGES", "20"))
+
+# 리포트 1건 전체의 마감 시간 (초). 넘기면 남은 카테고리를 비운 부분 리포트를 반환
+DRUG_REPORT_DEADLINE = float(os.getenv("DRUG_REPORT_DEADLINE_SEC", "4"))
+# 백그라운드 갱신은 사용자가 기다리지 않으므로 여유 있게
+DRUG_REFRESH_DEADLINE = float(os.getenv("DRUG_REFRESH_DEADLINE_SEC", "20"))
+
+# 헤지 요청: 카테고리별 응답 시간의 이 백분위를 넘기면 같은 요청을 한 번 더 보냄
+DRUG_HEDGE_ENABLED = os.getenv("DRUG_HEDGE_ENABLED", "True").lower() == "true"
+DRUG_HEDGE_PERCENTILE = float(os.getenv("DRUG_HEDGE_PERCENTILE", "0.95"))
+DRUG_HEDGE_MIN_DELAY = float(os.getenv("DRUG_HEDGE_MIN_DELAY_SEC", "0.3"))
+DRUG_HEDGE_MIN_SAMPLES = 20
+DRUG_HEDGE_WINDOW = 200
+
+# 호출할 API 목록 정의 (이름: 엔드포인트URL)
+# config.py에 해당 URL들이 정의되어 있어야 합니다.
+DUR_APIS = {
+    "병용금기": URL_DUR_MIXTURE,       # /getUsjntTabooInfoList03
+    "노인주의": URL_DUR_ELDERLY,      # /getOdsnAtentInfoList03
+    "연령대금기": URL_DUR_AGE,        # /getSpcifyAgrdeTabooInfoList03
+    "용량주의": URL_DUR_CAPACITY,     # /getCpctyAtentInfoList03
+    "투여기간주의": URL_DUR_PERIOD,   # /getMdctnPdAtentInfoList03
+    "효능군중복": URL_DUR_DUPLICATE,  # /getEfcyDplctInfoList03
+    "임부금기": URL_DUR_PREGNANT,     # /getPwnmTabooInfoList03
+    "분할주의": URL_DUR_PARTITION     # /getSeobangjeongPartitnAtentInfoList03
+}
+
+# =========================================================
+# 전용 이벤트 루프 + 공유 HTTP 클라이언트
+# =========================================================
+# httpx.AsyncClient 는 생성된 이벤트 루프에 묶이므로, 백그라운드 스레드에
+# 루프 하나를 띄워 모든 호출(동기/비동기 호출자 모두)을 그 루프에서 실행합니다.
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+
+def _get_loop():
+    """약품 API 전용 이벤트 루프를 지연 생성합니다."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="drug-api-loop", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+def _get_client():
+    """공유 AsyncClient (반드시 전용 루프 안에서 호출)"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=BASIC_TIMEOUT,
+        )
+    return _client
+
+def _submit(coro):
+    """코루틴을 전용 루프에 제출하고 concurrent.futures.Future 를 반환합니다."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+def close_http_client():
+    """서버 종료 시 커넥션 풀 정리"""
+    if _loop is None or _client is None:
+        return
+
+    async def _close():
+        global _client
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+
+    _submit(_close()).result(timeout=5)
+
+# =========================================================
+# 단일 비행 (single-flight) 요청 병합
+# =========================================================
+# 같은 키의 요청이 진행 중이면 새로 호출하지 않고 그 결과를 함께 기다립니다.
+# 전용 루프 안에서만 접근합니다.
+_inflight = {}
+_single_flight_stats = {"leaders": 0, "joined": 0}
+
+def _single_flight(key, coro_factory):
+    task = _inflight.get(key)
+    if task is not None:
+        _single_flight_stats["joined"] += 1
+        return task
+    _single_flight_stats["leaders"] += 1
+    task = asyncio.ensure_future(coro_factory())
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+async def _await_shared(key, coro_factory):
+    # shield: 대기자 하나가 취소되어도 다른 대기자가 공유하는 호출은 계속 진행
+    return await asyncio.shield(_single_flight(key, coro_factory))
+
+def single_flight_stats():
+    return {**_single_flight_stats, "in_flight": len(_inflight)}
+
+# =========================================================
+# 개별 API 호출
+# =========================================================
+def _mock_report(item_name):
+    return {
+        "basic": {"itemName": item_name, "efcyQesitm": "테스트 효능"},
+        "safety": {"병용금기": [], "노인주의": [], "연령대금기": [], "용량주의": [], "투여기간주의": [], "효능군중복": [], "임부금기": [], "분할주의": []}
+    }
+
+def _default_params():
+    # 공통 파라미터
+    return {"serviceKey": DATA_GO_KR_KEY, "type": "json", "pageNo": 1, "numOfRows": 10}
+
+def _normalize_items(items):
+    # 결과가 없으면 "" 로, 1건이면 {"item": {...}} 형태로 오는 경우가 있어 리스트로 통일
+    if not items:
+        return []
+    if isinstance(items, dict):
+        items = items.get("item", [])
+        return items if isinstance(items, list) else [items]
+    return items
+
+async def _request_body(url, params, timeout):
     """
-    제공된 모든 DUR API 엔드포인트를 호출하여 종합적인 약품 안전 리포트를 생성합니다.
+    단일 페이지 호출. 응답의 body 를 반환하고 실패 시 None 을 반환합니다.
+    HTTP 200 이어도 header.resultCode 가 "00" 이 아니면(트래픽 초과, 키 오류 등) 실패로 봅니다.
     """
-    if USE_MOCK_DATA:
-        return {
-            "basic": {"itemName": item_name, "efcyQesitm": "테스트 효능"},
-            "safety": {"병용금기": [], "노인주의": [], "연령대금기": [], "용량주의": [], "투여기간주의": [], "효능군중복": [], "임부금기": [], "분할주의": []}
-        }
-
-    report = {
-        "basic": None,
-        "safety": {}
+    try:
+        res = await _get_client().get(url, params=params, timeout=timeout)
+        if res.status_code != 200:
+            return None
+        data = res.json()
+    except Exception:
+        return None
+    header = data.get('header') or {}
+    body = data.get('body')
+    if str(header.get('resultCode')) != "00" or not isinstance(body, dict):
+        logger.warning("공공데이터 API 오류 응답 (%s): %s %s", url.rsplit("/", 1)[-1], header.get('resultCode'), header.get('resultMsg'))
+        return None
+    return body
+
+# =========================================================
+# 헤지 요청 (hedged request)
+# =========================================================
+# 카테고리별 최근 응답 시간을 모아 두고, 요청이 그 백분위 지연을 넘기도록
+# 끝나지 않으면 같은 요청을 한 번 더 보내 먼저 성공한 쪽을 사용합니다.
+_latencies = {}  # 카테고리 -> deque[초]
+_hedge_stats = {"sent": 0, "won": 0, "partial_reports": 0}
+
+def _record_latency(key, seconds):
+    window = _latencies.get(key)
+    if window is None:
+        window = _latencies[key] = deque(maxlen=DRUG_HEDGE_WINDOW)
+    window.append(seconds)
+
+def _hedge_delay(key):
+    """헤지 요청을 보낼 시점(초). 표본이 부족하면 DUR_TIMEOUT 의 절반을 사용"""
+    window = _latencies.get(key)
+    if not window or len(window) < DRUG_HEDGE_MIN_SAMPLES:
+        return max(DRUG_HEDGE_MIN_DELAY, DUR_TIMEOUT / 2)
+    ordered = sorted(window)
+    index = min(len(ordered) - 1, int(len(ordered) * DRUG_HEDGE_PERCENTILE))
+    return max(DRUG_HEDGE_MIN_DELAY, ordered[index])
+
+async def _hedged(key, factory):
+    """factory() 코루틴을 실행하되, 늦어지면 한 번 헤지합니다. 실패 시 None"""
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(factory())
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(key))
+        if not done:
+            _hedge_stats["sent"] += 1
+            tasks.add(asyncio.ensure_future(factory()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    if task is not primary:
+                        _hedge_stats["won"] += 1
+                    _record_latency(key, time.perf_counter() - started)
+                    return result
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def hedge_stats():
+    return {
+        **_hedge_stats,
+        "hedge_delay": {key: round(_hedge_delay(key), 3) for key in _latencies},
     }
-    
-    # 공통 파라미터
-    default_params = {"serviceKey": DATA_GO_KR_KEY, "type": "json", "pageNo": 1, "numOfRows": 10}
+
+async def _fetch_body(url, params, timeout, key):
+    if not DRUG_HEDGE_ENABLED:
+        return await _request_body(url, params, timeout)
+    return await _hedged(key, lambda: _request_body(url, params, timeout))
+
+async def _fetch_items(url, params, timeout, key):
+    """단일 페이지의 items. 실패 시 None 을 반환합니다."""
+    body = await _fetch_body(url, params, timeout, key)
+    return None if body is None else _normalize_items(body.get('items'))
+
+async def _fetch_all_pages(url, params, timeout, key):
+    """
+    첫 페이지의 totalCount 를 보고 나머지 페이지를 동시에 받아 합칩니다.
+
+    Returns:
+        (items, complete) - 한 페이지라도 실패했거나 DUR_MAX_PAGES 상한에 걸려 다 받지 못하면
+        complete=False (받은 만큼은 반환)
+    """
+    params = {**params, "pageNo": 1, "numOfRows": DUR_PAGE_SIZE}
+    first = await _fetch_body(url, params, timeout, key)
+    if first is None:
+        return [], False
+
+    items = list(_normalize_items(first.get('items')))
+    try:
+        total = int(first.get('totalCount') or 0)
+    except (TypeError, ValueError):
+        total = len(items)
+    pages = math.ceil(total / DUR_PAGE_SIZE)
+    truncated = pages > DUR_MAX_PAGES
+    if truncated:
+        logger.warning(
+            "%s: totalCount %d 건이 페이지 상한(%d x %d)을 넘어 일부만 조회합니다.",
+            key, total, DUR_MAX_PAGES, DUR_PAGE_SIZE,
+        )
+        pages = DUR_MAX_PAGES
+    if pages <= 1:
+        return items, not truncated
+
+    rest = await asyncio.gather(*[
+        _fetch_items(url, {**params, "pageNo": page}, timeout, key) for page in range(2, pages + 1)
+    ])
+    complete = not truncated
+    for page_items in rest:
+        if page_items is None:
+            complete = False
+        else:
+            items.extend(page_items)
+    return items, complete
+
+async def _fetch_basic(item_seq_str):
+    """
+    1. 기본 정보 호출 (e약은요). Returns: (item, ok)
+    전문의약품처럼 e약은요에 없는 약은 (None, True) - 호출 실패(None, False)와 구분
+    """
+    items = await _fetch_items(URL_DRUG_INFO, {**_default_params(), "itemSeq": item_seq_str}, BASIC_TIMEOUT, "basic")
+    if items is None:
+        return None, False
+    return (items[0] if items else None), True
+
+async def _fetch_dur(title, url, item_seq_str, item_name):
+    """DUR 카테고리 1종의 모든 페이지. Returns: (items, complete)"""
+    params = _default_params()
+    # 병용금기는 제품명(itemName)으로 검색하는 것이 더 정확할 때가 많음
+    if title == "병용금기":
+        params["itemName"] = item_name
+        # 이름 기준 조회라 item_seq 가 달라도 같은 이름이면 결과를 공유
+        return await _await_shared((title, item_name), lambda: _fetch_all_pages(url, params, DUR_TIMEOUT, title))
+    params["itemSeq"] = item_seq_str
+    return await _fetch_all_pages(url, params, DUR_TIMEOUT, title)
+
+def _task_result(task):
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return None
+    return task.result()
+
+async def _build_report(item_seq, item_name, deadline=None):
+    """
+    e약은요 1건 + DUR 8종을 동시에 호출해 리포트를 조립합니다.
+    전체 호출이 하나의 마감 시간(deadline 초)을 공유하며, 그 안에 끝나지 않은
+    카테고리는 비워 두고 report["missing"] 에 표시합니다. 일부 페이지만 받은 카테고리
+    (페이지 실패 또는 DUR_MAX_PAGES 초과)도 받은 만큼 담고 missing 에 표시합니다.
+
+    Returns:
+        (report, failed) - failed 는 호출에 실패한 카테고리 목록 ("basic" 포함 가능)
+    """
     item_seq_str = str(item_seq).strip()
+    titles = list(DUR_APIS.keys())
+    deadline = DRUG_REPORT_DEADLINE if deadline is None else deadline
 
-    # 호출할 API 목록 정의 (이름: 엔드포인트URL)
-    # config.py에 해당 URL들이 정의되어 있어야 합니다.
-    dur_apis = {
-        "병용금기": URL_DUR_MIXTURE,       # /getUsjntTabooInfoList03
-        "노인주의": URL_DUR_ELDERLY,      # /getOdsnAtentInfoList03
-        "연령대금기": URL_DUR_AGE,        # /getSpcifyAgrdeTabooInfoList03
-        "용량주의": URL_DUR_CAPACITY,     # /getCpctyAtentInfoList03
-        "투여기간주의": URL_DUR_PERIOD,   # /getMdctnPdAtentInfoList03
-        "효능군중복": URL_DUR_DUPLICATE,  # /getEfcyDplctInfoList03
-        "임부금기": URL_DUR_PREGNANT,     # /getPwnmTabooInfoList03
-        "분할주의": URL_DUR_PARTITION     # /getSeobangjeongPartitnAtentInfoList03
-    }
+    # 2. 기본 정보와 모든 DUR 정보를 한 번에 요청 (가장 느린 1건만큼만 대기)
+    tasks = {"basic": asyncio.ensure_future(_fetch_basic(item_seq_str))}
+    for title in titles:
+        tasks[title] = asyncio.ensure_future(_fetch_dur(title, DUR_APIS[title], item_seq_str, item_name))
+    try:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+    # cancel() 은 취소 요청일 뿐이므로 실제로 끝날 때까지 기다린 뒤 결과를 읽음
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    timed_out = [name for name, task in tasks.items() if not task.done() or task.cancelled()]
+    if timed_out:
+        logger.warning("리포트 마감 시간 초과 (%s): %s", item_seq_str, ", ".join(timed_out))
+
+    basic, basic_ok = _task_result(tasks["basic"]) or (None, False)
+    failed = [] if basic_ok else ["basic"]
+    safety = {}
+    for title in titles:
+        result = _task_result(tasks[title])
+        items, complete = result if result is not None else ([], False)
+        if not complete:
+            # 일부 페이지만 받은 카테고리도 실패로 보고 캐시하지 않음
+            failed.append(title)
+        safety[title] = items
+
+    # 시간 초과뿐 아니라 호출 실패(기본 정보 포함)·일부 페이지만 받은(실패/상한 초과) 카테고리도 "조회하지 못함"으로 표시
+    missing = timed_out + [title for title in failed if title not in timed_out]
+    report = {"basic": basic, "safety": safety}
+    if missing:
+        _hedge_stats["partial_reports"] += 1
+        report["missing"] = missing
+    return report, failed
+
+# =========================================================
+# 리포트 캐시 (프로세스 LRU → drug_cache)
+# =========================================================
+# LRU 항목의 만료 판단은 저장 시각을 보고 직접 하므로 ttl 을 두지 않음 (stale 제공 위해)
+_report_lru = CompressedLRU(
+    "drug_report",
+    max_entries=DRUG_LRU_MAX_ENTRIES,
+    max_bytes=DRUG_LRU_MAX_BYTES,
+)
+
+def report_cache_stats():
+    """프로세스 LRU 적중/미스/축출 카운터"""
+    return _report_lru.stats()
+
+def _read_cache(item_seq_str):
+    """캐시 조회. DB 오류는 캐시 미스로 취급합니다."""
+    try:
+        return get_cached_report(item_seq_str)
+    except Exception as e:
+        logger.warning("drug_cache 조회 실패 (%s): %s", item_seq_str, e)
+        return None
+
+def _write_cache(item_seq_str, item_name, report):
+    try:
+        save_cached_report(item_seq_str, item_name, report)
+    except Exception as e:
+        logger.warning("drug_cache 저장 실패 (%s): %s", item_seq_str, e)
+
+async def _store_report(item_seq_str, item_name, report):
+    await asyncio.to_thread(_write_cache, item_seq_str, item_name, report)
+    _report_lru.set(item_seq_str, report)
+
+def _lookup_hot(item_seq_str, item_name):
+    """
+    LRU 조회 (호출자 스레드에서 실행). 신선하면 그대로 반환하고,
+    허용 범위 안의 stale 항목이면 백그라운드 갱신을 예약한 뒤 반환합니다.
+    """
+    entry = _report_lru.get_entry(item_seq_str)
+    if entry is None:
+        return None
+    report, stored_at = entry
+    age = time.time() - stored_at
+    if age < DRUG_CACHE_TTL:
+        return report
+    if age < DRUG_CACHE_TTL + DRUG_CACHE_MAX_STALE:
+        _get_loop().call_soon_threadsafe(_start_refresh, item_seq_str, item_name)
+        return report
+    return None
+
+async def _get_report(item_seq, item_name, deadline=None):
+    """캐시 → 업스트림 순으로 리포트를 조회하는 read-through 경로 (deadline: 업스트림 마감 초)"""
+    item_seq_str = str(item_seq).strip()
+
+    cached = await asyncio.to_thread(_read_cache, item_seq_str)
+    if cached:
+        report, stored_at = cached
+        age = time.time() - stored_at
+        if age < DRUG_CACHE_TTL + DRUG_CACHE_MAX_STALE:
+            # 저장 시각을 그대로 넘겨 LRU 와 DB 의 만료 시점을 맞춤
+            _report_lru.set(item_seq_str, report, stored_at=stored_at)
+            if age >= DRUG_CACHE_TTL:
+                # stale-while-revalidate: 일단 기존 리포트를 주고 뒤에서 갱신
+                _start_refresh(item_seq_str, item_name)
+            return report
+
+    report, failed = await _build_report(item_seq_str, item_name, deadline=deadline)
+
+    # 실패한 호출이 섞인 리포트는 캐시하지 않음 (빈 결과로 캐시가 오염되는 것 방지)
+    if not failed:
+        await _store_report(item_seq_str, item_name, report)
+    return report
+
+async def _get_report_shared(item_seq, item_name, deadline=None):
+    """동시에 들어온 같은 (item_seq, item_name) 조회는 하나의 조회로 병합"""
+    # 마감 시간이 다른 조회(대화형 / 프리웜)는 서로의 마감에 묶이지 않도록 따로 병합
+    key = ("report", str(item_seq).strip(), item_name, deadline)
+    return await _await_shared(key, lambda: _get_report(item_seq, item_name, deadline=deadline))
+
+# =========================================================
+# 백그라운드 갱신 (stale-while-revalidate + 만료 임박 스윕)
+# =========================================================
+# 아래 상태는 모두 전용 루프 안에서만 접근합니다.
+_refreshing = {}          # item_seq -> 진행 중인 갱신 Task
+_refresh_semaphore = None
+_sweeper_task = None
+_refresh_stats = {"scheduled": 0, "succeeded": 0, "failed": 0, "sweeps": 0, "last_sweep": None}
+
+def _get_refresh_semaphore():
+    global _refresh_semaphore
+    if _refresh_semaphore is None:
+        # data.go.kr 쿼터 보호: 갱신 1건 = 호출 9건
+        _refresh_semaphore = asyncio.Semaphore(DRUG_REFRESH_CONCURRENCY)
+    return _refresh_semaphore
+
+def _start_refresh(item_seq_str, item_name):
+    """갱신 태스크를 시작합니다. 같은 약이 이미 갱신 중이면 그 태스크를 반환합니다."""
+    task = _refreshing.get(item_seq_str)
+    if task is not None:
+        return task
+    _refresh_stats["scheduled"] += 1
+    task = asyncio.ensure_future(_refresh(item_seq_str, item_name))
+    _refreshing[item_seq_str] = task
+    task.add_done_callback(lambda _: _refreshing.pop(item_seq_str, None))
+    return task
 
-    # 1. 기본 정보 호출 (e약은요)
+async def _refresh(item_seq_str, item_name):
     try:
-        res = requests.get(URL_DRUG_INFO, params={**default_params, "itemSeq": item_seq_str}, timeout=5)
-        if res.status_code == 200:
-            items = res.json().get('body', {}).get('items', [])
-            if items: report['basic'] = items[0]
-    except: pass
-
-    # 2. 모든 DUR 정보 순회하며 호출
-    for title, url in dur_apis.items():
+        async with _get_refresh_semaphore():
+            report, failed = await _build_report(item_seq_str, item_name, deadline=DRUG_REFRESH_DEADLINE)
+        if failed:
+            # 기존 stale 항목을 유지하고 다음 요청/스윕에서 재시도
+            _refresh_stats["failed"] += 1
+            return
+        await _store_report(item_seq_str, item_name, report)
+        _refresh_stats["succeeded"] += 1
+    except Exception as e:
+        _refresh_stats["failed"] += 1
+        logger.warning("리포트 갱신 실패 (%s): %s", item_seq_str, e)
+
+async def _sweep_once():
+    """만료가 임박한 항목을 찾아 미리 갱신합니다."""
+    threshold = time.time() - (DRUG_CACHE_TTL - DRUG_REFRESH_AHEAD)
+    rows = await asyncio.to_thread(get_expiring_reports, threshold, DRUG_REFRESH_BATCH)
+    tasks = [_start_refresh(str(seq), name) for seq, name in rows]
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    _refresh_stats["sweeps"] += 1
+    _refresh_stats["last_sweep"] = time.time()
+
+async def _sweep_loop():
+    while True:
         try:
-            # 병용금기는 제품명(itemName)으로 검색하는 것이 더 정확할 때가 많음
-            params = default_params.copy()
-            if title == "병용금기":
-                params["itemName"] = item_name
-            else:
-                params["itemSeq"] = item_seq_str
-                
-            res = requests.get(url, params=params, timeout=3)
-            if res.status_code == 200:
-                report['safety'][title] = res.json().get('body', {}).get('items', [])
-            else:
-                report['safety'][title] = []
-        except:
-            report['safety'][title] = []
-
-    return report
\ No newline at end of file
+            await _sweep_once()
+        except Exception as e:
+            logger.warning("리포트 스윕 실패: %s", e)
+        await asyncio.sleep(DRUG_REFRESH_INTERVAL)
+
+def start_background_refresher():
+    """주기적 스윕 시작 (서버 startup 에서 호출)"""
+    if USE_MOCK_DATA:
+        return
+
+    def _start():
+        global _sweeper_task
+        if _sweeper_task is None:
+            _sweeper_task = asyncio.ensure_future(_sweep_loop())
+
+    _get_loop().call_soon_threadsafe(_start)
+
+def stop_background_refresher():
+    if _loop is None:
+        return
+
+    def _stop():
+        global _sweeper_task
+        if _sweeper_task is not None:
+            _sweeper_task.cancel()
+            _sweeper_task = None
+
+    _loop.call_soon_threadsafe(_stop)
+
+def refresher_stats():
+    return {**_refresh_stats, "in_flight": len(_refreshing)}
+
+# =========================================================
+# 프리웜 (배포 직후 콜드 캐시 방지)
+# =========================================================
+_prewarm_stats = {"status": "idle", "total": 0, "done": 0, "ok": 0, "elapsed": None}
+
+async def _prewarm(items, concurrency, progress_every=10):
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(items)
+    started = time.perf_counter()
+    _prewarm_stats.update(status="running", total=total, done=0, ok=0, elapsed=None)
+    print(f"🔥 리포트 프리웜 시작: {total}건 (동시 {concurrency})")
+
+    async def _one(item_seq, item_name):
+        async with semaphore:
+            try:
+                # 사용자가 기다리는 요청이 아니므로 백그라운드 갱신과 같은 넉넉한 마감 사용
+                report = await _get_report_shared(item_seq, item_name, deadline=DRUG_REFRESH_DEADLINE)
+                if report.get("basic") is not None:
+                    _prewarm_stats["ok"] += 1
+            except Exception as e:
+                logger.warning("프리웜 실패 (%s): %s", item_seq, e)
+        _prewarm_stats["done"] += 1
+        done = _prewarm_stats["done"]
+        if done % progress_every == 0 or done == total:
+            print(f"   ... {done}/{total} ({time.perf_counter() - started:.1f}초)")
+
+    await asyncio.gather(*[_one(seq, name) for seq, name in items])
+
+    elapsed = round(time.perf_counter() - started, 2)
+    _prewarm_stats.update(status="done", elapsed=elapsed)
+    print(f"✅ 리포트 프리웜 완료: {_prewarm_stats['ok']}/{total}건 성공, {elapsed}초 소요")
+    return dict(_prewarm_stats)
+
+def prewarm_reports(label_map, concurrency=None, wait=True):
+    """
+    drug_mapping.json 의 모든 클래스에 대해 리포트를 미리 받아 캐시에 채웁니다.
+
+    Args:
+        label_map (dict): {class_id: {"code": 품목코드, "name": 제품명}}
+        concurrency (int): 동시에 조회할 약 수 (기본 DRUG_PREWARM_CONCURRENCY)
+        wait (bool): False 면 기다리지 않고 concurrent.futures.Future 를 반환
+    """
+    if USE_MOCK_DATA:
+        print("ℹ️ USE_MOCK_DATA 모드라 프리웜을 건너뜁니다.")
+        return None
+
+    items = [(meta["code"], meta["name"]) for meta in label_map.values() if meta.get("code")]
+    future = _submit(_prewarm(items, concurrency or DRUG_PREWARM_CONCURRENCY))
+    return future.result() if wait else future
+
+def prewarm_stats():
+    return dict(_prewarm_stats)
+
+# =========================================================
+# 오프라인 DUR 저장소
+# =========================================================
+def _lookup_local(item_seq, item_name):
+    """
+    DRUG_REPORT_SOURCE 가 local/local_first 면 로컬 저장소에서 리포트를 조립합니다.
+    API 로 넘겨야 하면 None 을 반환합니다.
+    """
+    if DRUG_REPORT_SOURCE not in ("local", "local_first"):
+        return None
+    try:
+        report = dur_local.lookup_report(item_seq, item_name)
+    except Exception as e:
+        logger.warning("로컬 DUR 조회 실패 (%s): %s", item_seq, e)
+        report = None
+    if DRUG_REPORT_SOURCE == "local":
+        if report is None:
+            # local 전용 모드: 네트워크로 넘기지 않되, 저장소에 없는 약은 "경고 없음"이 아니라 "조회하지 못함"
+            return {"basic": None, "safety": {title: [] for title in DUR_APIS}, "missing": ["basic"] + list(DUR_APIS)}
+        return report
+    if report is not None and report.get("missing"):
+        # local_first: 적재되지 않은 카테고리가 있으면 API 로 전체 리포트를 받음
+        return None
+    return report
+
+# =========================================================
+# 공개 API
+# =========================================================
+async def get_full_drug_report_async(item_seq, item_name):
+    """
+    get_full_drug_report 의 비동기 버전. 캐시를 먼저 확인하고, 없으면 9개 API 를
+    공유 커넥션 풀로 동시에 호출합니다. 만료된 캐시는 즉시 반환하고 뒤에서 갱신합니다.
+    """
+    if USE_MOCK_DATA:
+        return _mock_report(item_name)
+    local = _lookup_local(item_seq, item_name)
+    if local is not None:
+        return local
+    hot = _lookup_hot(str(item_seq).strip(), item_name)
+    if hot is not None:
+        return hot
+    return await asyncio.wrap_future(_submit(_get_report_shared(item_seq, item_name)))
+
+def get_full_drug_report(item_seq, item_name):
+    """
+    제공된 모든 DUR API 엔드포인트를 호출하여 종합적인 약품 안전 리포트를 생성합니다.
+    (기존 호출부 호환용 동기 래퍼)
+    """
+    if USE_MOCK_DATA:
+        return _mock_report(item_name)
+    local = _lookup_local(item_seq, item_name)
+    if local is not None:
+        return local
+    hot = _lookup_hot(str(item_seq).strip(), item_name)
+    if hot is not None:
+        return hot
+    return _submit(_get_report_shared(item_seq, item_name)).result()
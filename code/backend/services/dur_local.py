@@ -0,0 +1,304 @@
+"""
+오프라인 DUR 저장소
+
+data.go.kr 에서 일괄 제공하는 e약은요 / DUR 품목 데이터셋(CSV 또는 JSON)을
+인덱스가 걸린 로컬 SQLite 파일로 적재하고, 네트워크 없이 리포트를 조립합니다.
+
+데이터 디렉토리 구성 (파일명 = 카테고리, 확장자 .csv 또는 .json):
+    e약은요.csv, 병용금기.csv, 노인주의.csv, 연령대금기.csv, 용량주의.csv,
+    투여기간주의.csv, 효능군중복.csv, 임부금기.csv, 분할주의.csv
+컬럼명은 API 응답 필드명(ITEM_SEQ, ITEM_NAME, ... / itemSeq, itemName, ...)을 그대로 사용합니다.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DUR_LOCAL_DB = os.getenv("DUR_LOCAL_DB", "dur_local.db")
+
+BASIC_CATEGORY = "e약은요"
+DUR_CATEGORIES = ["병용금기", "노인주의", "연령대금기", "용량주의", "투여기간주의", "효능군중복", "임부금기", "분할주의"]
+
+# 카테고리별로 이름 기준 조회를 하는 항목 (API 호출 방식과 동일하게 맞춤)
+NAME_KEYED_CATEGORIES = {"병용금기"}
+
+# DUR 행에서 "이 약"의 성분명을 담는 필드 (MIXTURE_* 는 상대 약이므로 제외)
+INGREDIENT_FIELDS = ("INGR_KOR_NAME", "INGR_NAME", "INGR_ENG_NAME")
+
+_local = threading.local()
+
+
+# =========================================================
+# 적재 (importer)
+# =========================================================
+def _read_rows(path):
+    """CSV(utf-8 / cp949) 또는 JSON(리스트 또는 API 응답 형태) 파일을 dict 리스트로 읽습니다."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("body", data).get("items", [])
+        return data
+
+    for encoding in ("utf-8-sig", "cp949"):
+        try:
+            with open(path, "r", encoding=encoding, newline="") as f:
+                return list(csv.DictReader(f))
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"인코딩을 알 수 없는 파일입니다: {path}")
+
+def _key_fields(row):
+    item_seq = row.get("ITEM_SEQ") or row.get("itemSeq") or ""
+    item_name = row.get("ITEM_NAME") or row.get("itemName") or ""
+    return str(item_seq).strip(), str(item_name).strip()
+
+def _find_source(source_dir, category):
+    for ext in (".csv", ".json"):
+        path = os.path.join(source_dir, category + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def _create_schema(conn):
+    conn.executescript('''
+        CREATE TABLE drug_basic (
+            item_seq TEXT PRIMARY KEY,
+            item_name TEXT,
+            payload TEXT NOT NULL
+        );
+        CREATE TABLE dur_items (
+            category TEXT NOT NULL,
+            item_seq TEXT,
+            item_name TEXT,
+            payload TEXT NOT NULL
+        );
+        CREATE TABLE dur_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    ''')
+
+def _create_indexes(conn):
+    # 적재가 끝난 뒤에 인덱스를 만드는 편이 훨씬 빠름
+    conn.executescript('''
+        CREATE INDEX idx_dur_items_seq ON dur_items (category, item_seq);
+        CREATE INDEX idx_dur_items_name ON dur_items (category, item_name);
+        CREATE INDEX idx_drug_basic_name ON drug_basic (item_name);
+    ''')
+
+def import_bulk(source_dir, db_path=None, version=None):
+    """
+    데이터 디렉토리를 읽어 로컬 DUR 저장소를 새로 만듭니다.
+    임시 파일에 적재한 뒤 교체하므로 조회 중인 서버에 영향을 주지 않습니다.
+
+    Returns:
+        dict: 버전, 적재 시각, 카테고리별 행 수
+    """
+    db_path = db_path or DUR_LOCAL_DB
+    tmp_path = db_path + ".importing"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    counts = {}
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        _create_schema(conn)
+
+        for category in [BASIC_CATEGORY] + DUR_CATEGORIES:
+            path = _find_source(source_dir, category)
+            if path is None:
+                print(f"⚠️ {category} 데이터 파일이 없습니다. 건너뜁니다.")
+                continue
+            with open(path, "rb") as f:
+                digest.update(f.read())
+
+            rows = _read_rows(path)
+            if category == BASIC_CATEGORY:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO drug_basic (item_seq, item_name, payload) VALUES (?, ?, ?)",
+                    [(*_key_fields(row), json.dumps(row, ensure_ascii=False)) for row in rows],
+                )
+            else:
+                conn.executemany(
+                    "INSERT INTO dur_items (category, item_seq, item_name, payload) VALUES (?, ?, ?, ?)",
+                    [(category, *_key_fields(row), json.dumps(row, ensure_ascii=False)) for row in rows],
+                )
+            counts[category] = len(rows)
+            print(f"   ... {category}: {len(rows)}건")
+
+        _create_indexes(conn)
+
+        meta = {
+            "version": version or time.strftime("%Y%m%d%H%M%S") + "-" + digest.hexdigest()[:8],
+            "imported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "source_dir": os.path.abspath(source_dir),
+            "counts": json.dumps(counts, ensure_ascii=False),
+            # 실제로 적재된 카테고리 (파일이 없어 건너뛴 카테고리는 조회 시 "missing" 으로 표시)
+            "categories": json.dumps(list(counts), ensure_ascii=False),
+        }
+        conn.executemany("INSERT INTO dur_meta (key, value) VALUES (?, ?)", meta.items())
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    print(f"✅ 로컬 DUR 저장소 적재 완료: {meta['version']} ({time.perf_counter() - started:.1f}초)")
+    return {**meta, "counts": counts, "categories": list(counts)}
+
+def refresh(db_path=None):
+    """마지막으로 적재한 데이터 디렉토리에서 다시 적재합니다."""
+    info = get_version(db_path)
+    if not info or not info.get("source_dir"):
+        raise RuntimeError("이전 적재 기록이 없습니다. 먼저 import 를 실행하세요.")
+    return import_bulk(info["source_dir"], db_path=db_path)
+
+# =========================================================
+# 조회 (lookup)
+# =========================================================
+def _get_conn(db_path):
+    """
+    스레드별 읽기 전용 연결. 저장소 파일이 교체(refresh)되면 다시 엽니다.
+    파일이 없으면 None.
+    """
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    signature = (db_path, stat.st_ino, stat.st_mtime_ns)
+
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    cached = conns.get(db_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conns[db_path] = (signature, conn)
+    return conn
+
+def get_version(db_path=None):
+    """저장소 버전 정보. 저장소가 없으면 None"""
+    conn = _get_conn(db_path or DUR_LOCAL_DB)
+    if conn is None:
+        return None
+    info = dict(conn.execute("SELECT key, value FROM dur_meta").fetchall())
+    if "counts" in info:
+        info["counts"] = json.loads(info["counts"])
+    if "categories" in info:
+        info["categories"] = json.loads(info["categories"])
+    elif "counts" in info:
+        # categories 기록 이전에 적재한 저장소: counts 에는 적재된 카테고리만 있음
+        info["categories"] = list(info["counts"])
+    return info
+
+def is_available(db_path=None):
+    return _get_conn(db_path or DUR_LOCAL_DB) is not None
+
+def lookup_report(item_seq, item_name, db_path=None):
+    """
+    로컬 저장소에서 get_full_drug_report 와 같은 형태의 리포트를 만듭니다.
+    적재되지 않은 카테고리는 빈 리스트 대신 report["missing"] 에 표시합니다.
+    저장소가 없거나 해당 약이 전혀 없으면 None.
+    """
+    conn = _get_conn(db_path or DUR_LOCAL_DB)
+    if conn is None:
+        return None
+    item_seq_str = str(item_seq).strip()
+    info = get_version(db_path) or {}
+    loaded = set(info.get("categories") or [BASIC_CATEGORY] + DUR_CATEGORIES)
+
+    row = conn.execute("SELECT payload FROM drug_basic WHERE item_seq = ?", (item_seq_str,)).fetchone()
+    basic = json.loads(row[0]) if row else None
+
+    safety = {}
+    for category in DUR_CATEGORIES:
+        if category in NAME_KEYED_CATEGORIES:
+            rows = conn.execute(
+                "SELECT payload FROM dur_items WHERE category = ? AND item_name = ?"
+                " UNION ALL "
+                "SELECT payload FROM dur_items WHERE category = ? AND item_seq = ? AND item_name != ?",
+                (category, item_name, category, item_seq_str, item_name),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT payload FROM dur_items WHERE category = ? AND item_seq = ?",
+                (category, item_seq_str),
+            ).fetchall()
+        safety[category] = [json.loads(r[0]) for r in rows]
+
+    if basic is None and not any(safety.values()):
+        return None
+    report = {"basic": basic, "safety": safety}
+    missing = ["basic"] if BASIC_CATEGORY not in loaded else []
+    missing += [category for category in DUR_CATEGORIES if category not in loaded]
+    if missing:
+        report["missing"] = missing
+    return report
+
+def row_ingredient_names(row):
+    """
+    DUR 행 1건에서 해당 약의 성분명 집합을 꺼냅니다.
+    MAIN_INGR 는 "[M040702]포도당|[M040426]염화나트륨" 형태입니다.
+    """
+    names = set()
+    for field in INGREDIENT_FIELDS:
+        value = str(row.get(field) or "").strip()
+        if value:
+            names.add(value)
+    for part in str(row.get("MAIN_INGR") or "").split("|"):
+        part = re.sub(r"^\[[^\]]*\]", "", part).strip()
+        if part:
+            names.add(part)
+    return names
+
+def find_ingredients(item_name, item_seq=None, db_path=None):
+    """
+    제품명(접두 일치) 또는 품목코드로 DUR 행을 찾아 성분명 집합을 반환합니다.
+    OCR 로 읽은 "리피토정10밀리그램" 도 "리피토정10밀리그램(아토르바스타틴...)" 행과 맞춰지도록
+    이름(원문, 공백 제거본)으로 접두 검색합니다. 저장소가 없거나 찾지 못하면 빈 집합.
+    """
+    conn = _get_conn(db_path or DUR_LOCAL_DB)
+    if conn is None:
+        return set()
+    raw_name = str(item_name or "").strip()
+    prefixes = {p for p in (raw_name, "".join(raw_name.split())) if p}
+    seq = str(item_seq or "").strip()
+
+    names = set()
+    for category in DUR_CATEGORIES:
+        rows = []
+        if seq:
+            rows = conn.execute(
+                "SELECT payload FROM dur_items WHERE category = ? AND item_seq = ?", (category, seq),
+            ).fetchall()
+        else:
+            for prefix in prefixes:
+                # (category, item_name) 인덱스를 타는 접두 범위 검색
+                rows += conn.execute(
+                    "SELECT payload FROM dur_items WHERE category = ? AND item_name >= ? AND item_name < ? LIMIT 50",
+                    (category, prefix, prefix + "\uffff"),
+                ).fetchall()
+        for (payload,) in rows:
+            names |= row_ingredient_names(json.loads(payload))
+    return names
+
+def iter_category(category, db_path=None):
+    """카테고리의 모든 행을 순회합니다. (상호작용 인덱스 구축용)"""
+    conn = _get_conn(db_path or DUR_LOCAL_DB)
+    if conn is None:
+        return
+    for (payload,) in conn.execute("SELECT payload FROM dur_items WHERE category = ?", (category,)):
+        yield json.loads(payload)
@@ -0,0 +1,311 @@
+"""
+음식 성분 - 약물 상호작용 규칙 테이블
+
+음식 사진에서 Gemini 는 음식/식재료 인식(main_ingredients)만 하고,
+복용 약과의 상호작용 판정은 이 규칙 테이블로 결정적으로 계산합니다.
+같은 (식재료 집합, 약 집합) 이면 항상 같은 경고가 나오고, 결과는 캐시됩니다.
+
+사용자 약은 제품명("리피토정10밀리그램")으로 등록되므로, 규칙과 맞추기 전에
+DUR 데이터(병용금기 인덱스에 모인 drug_cache 리포트 + 로컬 DUR 저장소)의 성분명
+(INGR_KOR_NAME 등)으로 풀어냅니다. 성분을 찾지 못한 약은 "상호작용 없음"이 아니라
+unresolved 로 돌려줍니다.
+
+FOOD_RULES_PATH 에 JSON 파일(규칙 리스트, 아래 FOOD_RULES 와 같은 형태)을 지정하면
+내장 규칙 대신 사용합니다.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from services import dur_local
+from services import interaction_engine
+from services.memory_cache import CompressedLRU
+
+logger = logging.getLogger(__name__)
+
+FOOD_RULES_PATH = os.getenv("FOOD_RULES_PATH", "")
+
+FOOD_VERDICT_CACHE_TTL = float(os.getenv("FOOD_VERDICT_CACHE_TTL_MIN", "1440")) * 60
+FOOD_VERDICT_CACHE_MAX = int(os.getenv("FOOD_VERDICT_CACHE_MAX", "2048"))
+
+NO_INTERACTION_MESSAGE = "특이사항 없습니다."
+NO_DRUGS_MESSAGE = "등록된 복용 약이 없어 음식과의 상호작용은 확인하지 않았어요."
+
+# foods: 식재료 별칭 (부분 일치), drugs: 약 이름/성분/계열 키워드 (부분 일치)
+FOOD_RULES = [
+    {
+        "group": "자몽",
+        "foods": ["자몽", "포멜로", "grapefruit"],
+        "drugs": ["심바스타틴", "아토르바스타틴", "로바스타틴", "펠로디핀", "니페디핀", "암로디핀",
+                  "사이클로스포린", "시클로스포린", "타크로리무스", "부스피론", "실데나필"],
+        "severity": "high",
+        "reason": "자몽 성분이 약물 대사 효소(CYP3A4)를 억제해 약의 혈중 농도를 높일 수 있어요.",
+    },
+    {
+        "group": "대두",
+        "foods": ["대두", "콩", "두부", "두유", "된장", "청국장", "낫토", "soy"],
+        "drugs": ["갑상선", "레보티록신", "신지로이드", "씬지로이드"],
+        "severity": "caution",
+        "reason": "대두 성분이 갑상선 호르몬제의 흡수를 떨어뜨릴 수 있어요. 복용 간격을 4시간 이상 두세요.",
+    },
+    {
+        "group": "유제품",
+        "foods": ["우유", "치즈", "요거트", "요구르트", "유제품", "버터", "크림", "milk", "cheese", "yogurt"],
+        "drugs": ["테트라사이클린", "독시사이클린", "미노사이클린", "시프로플록사신", "레보플록사신",
+                  "오플록사신", "목시플록사신", "알렌드론산", "리세드론산"],
+        "severity": "caution",
+        "reason": "칼슘이 약과 결합해 흡수를 크게 떨어뜨릴 수 있어요. 복용 전후 2시간은 피하세요.",
+    },
+    {
+        "group": "술",
+        "foods": ["알코올", "맥주", "소주", "와인", "막걸리", "위스키", "청주", "술", "alcohol", "beer", "wine"],
+        "drugs": ["아세트아미노펜", "타이레놀", "메트포르민", "메트로니다졸", "와파린",
+                  "알프라졸람", "디아제팜", "로라제팜", "졸피뎀", "세티리진", "클로르페니라민",
+                  "이부프로펜", "아스피린", "나프록센"],
+        "severity": "high",
+        "reason": "알코올은 간 손상, 위장 출혈, 과도한 진정 등 약의 부작용을 키울 수 있어요.",
+    },
+    {
+        "group": "비타민K",
+        "foods": ["시금치", "케일", "브로콜리", "양배추", "청국장", "낫토", "근대", "상추", "spinach", "kale"],
+        "drugs": ["와파린", "쿠마딘"],
+        "severity": "caution",
+        "reason": "비타민K가 많은 채소는 와파린의 항응고 효과를 떨어뜨릴 수 있어요. 섭취량을 갑자기 바꾸지 마세요.",
+    },
+    {
+        "group": "카페인",
+        "foods": ["커피", "카페인", "에너지드링크", "에너지음료", "콜라", "coffee", "caffeine"],
+        "drugs": ["테오필린", "아미노필린", "에페드린", "슈도에페드린", "시프로플록사신"],
+        "severity": "caution",
+        "reason": "카페인과 함께 먹으면 두근거림, 불면 같은 자극 증상이 심해질 수 있어요.",
+    },
+    {
+        "group": "티라민",
+        "foods": ["숙성치즈", "살라미", "훈제", "젓갈", "tyramine"],
+        "drugs": ["셀레길린", "라사길린", "리네졸리드", "모클로베미드"],
+        "severity": "high",
+        "reason": "티라민이 많은 음식은 이 약과 함께 먹으면 혈압이 급격히 오를 수 있어요.",
+    },
+    {
+        "group": "칼륨",
+        "foods": ["바나나", "감자", "토마토", "오렌지", "고구마", "코코넛워터"],
+        "drugs": ["스피로노락톤", "에날라프릴", "라미프릴", "페린도프릴", "리시노프릴",
+                  "로사르탄", "발사르탄", "텔미사르탄", "올메사르탄", "칸데사르탄"],
+        "severity": "caution",
+        "reason": "칼륨이 많은 음식을 많이 먹으면 이 약과 함께 고칼륨혈증 위험이 커질 수 있어요.",
+    },
+]
+
+
+def _norm(text):
+    return "".join(str(text or "").split()).lower()
+
+
+def _split_drugs(drugs):
+    """"A, B" 문자열 또는 리스트 -> 중복 없는 약 이름 리스트"""
+    if isinstance(drugs, str):
+        drugs = drugs.split(",")
+    return sorted({d.strip() for d in drugs or [] if d and d.strip()})
+
+
+class RuleIndex:
+    """별칭 -> 규칙 번호 인덱스. 별칭 전체를 하나의 정규식으로 묶어 한 번에 훑습니다."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.food_alias = {}
+        self.drug_alias = {}
+        for i, rule in enumerate(rules):
+            for alias in rule["foods"]:
+                self.food_alias.setdefault(_norm(alias), set()).add(i)
+            for alias in rule["drugs"]:
+                self.drug_alias.setdefault(_norm(alias), set()).add(i)
+        self.food_pattern = self._compile(self.food_alias)
+        self.drug_pattern = self._compile(self.drug_alias)
+
+    @staticmethod
+    def _compile(aliases):
+        # 긴 별칭 우선 ("숙성치즈" 가 "치즈" 보다 먼저 매칭)
+        return re.compile("|".join(re.escape(a) for a in sorted(aliases, key=len, reverse=True)))
+
+    def _scan(self, text, pattern, aliases):
+        hits = set()
+        for alias in pattern.findall(_norm(text)):
+            hits |= aliases[alias]
+        return hits
+
+    def match_food(self, ingredient):
+        return self._scan(ingredient, self.food_pattern, self.food_alias)
+
+    def match_drug(self, drug_name):
+        return self._scan(drug_name, self.drug_pattern, self.drug_alias)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+_verdict_cache = CompressedLRU(
+    "food_verdict",
+    max_entries=FOOD_VERDICT_CACHE_MAX,
+    max_bytes=2 * 1024 * 1024,
+    ttl=FOOD_VERDICT_CACHE_TTL,
+)
+
+# 제품명 -> 성분명 (DUR 데이터 버전별)
+_ingredient_cache = CompressedLRU(
+    "food_drug_ingredients",
+    max_entries=FOOD_VERDICT_CACHE_MAX,
+    max_bytes=2 * 1024 * 1024,
+    ttl=FOOD_VERDICT_CACHE_TTL,
+)
+
+
+def _load_rules():
+    if FOOD_RULES_PATH and os.path.exists(FOOD_RULES_PATH):
+        with open(FOOD_RULES_PATH, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        print(f"✅ 음식-약물 규칙 로드: {FOOD_RULES_PATH} ({len(rules)}개)")
+        return rules
+    return FOOD_RULES
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RuleIndex(_load_rules())
+    return _index
+
+
+def _data_version():
+    """성분 정보 출처의 버전 (바뀌면 성분 해석과 판정 캐시를 새로 계산)"""
+    try:
+        return interaction_engine.get_index().version
+    except Exception as e:
+        logger.warning("병용금기 인덱스를 사용할 수 없습니다: %s", e)
+        return "none"
+
+
+def resolve_ingredients(drug_name, version=None):
+    """제품명 -> 성분명 리스트. 찾지 못하면 빈 리스트."""
+    version = version or _data_version()
+    key = f"{version}:{_norm(drug_name)}"
+    cached = _ingredient_cache.get(key)
+    if cached is not None:
+        return cached
+
+    names = set()
+    try:
+        names |= interaction_engine.get_index().find_ingredient_names(drug_name)
+    except Exception as e:
+        logger.warning("인덱스에서 성분 조회 실패 (%s): %s", drug_name, e)
+    try:
+        names |= dur_local.find_ingredients(drug_name)
+    except Exception as e:
+        logger.warning("로컬 DUR 에서 성분 조회 실패 (%s): %s", drug_name, e)
+    result = sorted(names)
+    _ingredient_cache.set(key, result)
+    return result
+
+
+def _build_message(interactions, unresolved):
+    unknown = ""
+    if unresolved:
+        unknown = (
+            f"{', '.join(unresolved)}은(는) 성분 정보를 찾지 못해 음식과의 상호작용을 확인하지 못했어요. "
+            f"드시기 전에 약사와 상담하세요."
+        )
+    if not interactions:
+        return unknown or NO_INTERACTION_MESSAGE
+    messages = []
+    for item in interactions:
+        messages.append(
+            f"사진 속 음식에 포함된 '{item['ingredient']}'은(는) 현재 복용 중인 {item['drug']}과(와) 먹으면 "
+            f"위험할 수 있으니 피하는 것이 좋을 것 같아요. {item['reason']}"
+        )
+    if unknown:
+        messages.append(unknown)
+    return "\n".join(messages)
+
+
+def evaluate(main_ingredients, drugs):
+    """
+    식재료와 복용 약 목록으로 상호작용을 판정합니다.
+
+    Args:
+        main_ingredients (list): Gemini 가 인식한 주요 식재료
+        drugs (str | list): 복용 약 ("A, B" 문자열 또는 리스트)
+
+    Returns:
+        dict: interaction_status ("interaction" / "clear" / "unknown" / "no_drugs"),
+              interactions (식재료/약/사유/위험도 목록), unresolved (성분을 찾지 못한 약), warning_message
+    """
+    ingredients = sorted({str(i).strip() for i in main_ingredients or [] if str(i).strip()})
+    drug_names = _split_drugs(drugs)
+    if not drug_names:
+        return {"interaction_status": "no_drugs", "interactions": [], "unresolved": [], "warning_message": NO_DRUGS_MESSAGE}
+
+    version = _data_version()
+    key = hashlib.sha1(
+        json.dumps([version, [_norm(i) for i in ingredients], [_norm(d) for d in drug_names]], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    cached = _verdict_cache.get(key)
+    if cached is not None:
+        return cached
+
+    index = get_index()
+    drug_rules = []
+    unresolved = []
+    for name in drug_names:
+        # 제품명 자체에 성분/계열 키워드가 들어 있으면(예: 와파린정) 그것도 식별된 것으로 봄
+        rule_ids = index.match_drug(name)
+        ingredient_names = resolve_ingredients(name, version)
+        for ingredient_name in ingredient_names:
+            rule_ids |= index.match_drug(ingredient_name)
+        if not ingredient_names and not rule_ids:
+            unresolved.append(name)
+        drug_rules.append((name, rule_ids))
+
+    interactions = []
+    seen = set()
+    for ingredient in ingredients:
+        for rule_id in sorted(index.match_food(ingredient)):
+            for drug_name, rule_ids in drug_rules:
+                if rule_id not in rule_ids or (rule_id, drug_name) in seen:
+                    continue
+                seen.add((rule_id, drug_name))
+                rule = index.rules[rule_id]
+                interactions.append({
+                    "ingredient": ingredient,
+                    "drug": drug_name,
+                    "group": rule["group"],
+                    "severity": rule.get("severity", "caution"),
+                    "reason": rule["reason"],
+                })
+
+    # 위험도 높은 항목을 먼저
+    interactions.sort(key=lambda item: item["severity"] != "high")
+    if interactions:
+        status = "interaction"
+    else:
+        status = "unknown" if unresolved else "clear"
+    verdict = {
+        "interaction_status": status,
+        "interactions": interactions,
+        "unresolved": unresolved,
+        "warning_message": _build_message(interactions, unresolved),
+    }
+    _verdict_cache.set(key, verdict)
+    return verdict
+
+
+def food_rules_stats():
+    return {
+        "rules": len(_index.rules) if _index is not None else None,
+        "verdict_cache": _verdict_cache.stats(),
+        "ingredient_cache": _ingredient_cache.stats(),
+    }
@@ -0,0 +1,135 @@
+"""
+Gemini 클라이언트 레지스트리
+
+genai.configure 는 프로세스당 한 번만, GenerativeModel 은 (모델명, generation_config)
+조합마다 한 번만 만들어 모든 서비스가 공유합니다.
+"""
+import json
+import logging
+import os
+import random
+import threading
+
+import google.generativeai as genai
+
+from services.llm_scheduler import scheduler, PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# 압축 프롬프트 A/B 비율 (0 이면 항상 기존 프롬프트, 1 이면 항상 압축 프롬프트)
+PROMPT_COMPACT_RATIO = float(os.getenv("PROMPT_COMPACT_RATIO", "0"))
+
+_models = {}
+_lock = threading.Lock()
+_configured_key = None
+
+
+def _api_key():
+    key = os.getenv("GEMINI_API_KEY")
+    if not key or key == "YOUR_GEMINI_API_KEY":
+        return None
+    return key
+
+
+def is_configured():
+    return _api_key() is not None
+
+
+def _ensure_configured():
+    global _configured_key
+    key = _api_key()
+    if key and key != _configured_key:
+        genai.configure(api_key=key)
+        _configured_key = key
+    return key is not None
+
+
+def _config_key(generation_config):
+    if not generation_config:
+        return None
+    return json.dumps(generation_config, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def get_model(model_name=DEFAULT_MODEL, generation_config=None):
+    """공유 GenerativeModel 을 반환합니다. (최초 호출 시 지연 생성)"""
+    key = (model_name, _config_key(generation_config))
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                _ensure_configured()
+                model = genai.GenerativeModel(model_name, generation_config=generation_config)
+                _models[key] = model
+    return model
+
+
+def warm_up(model_name=DEFAULT_MODEL):
+    """
+    설정과 모델 생성을 미리 끝내고, 가벼운 count_tokens 호출로 연결까지 열어 둡니다.
+    첫 실제 요청이 초기화 비용을 치르지 않도록 서버 시작 시 호출합니다.
+    """
+    if not _ensure_configured():
+        print("⚠️ GEMINI_API_KEY 가 없어 Gemini 워밍업을 건너뜁니다.")
+        return False
+    try:
+        scheduler.call(get_model(model_name).count_tokens, "ping", priority=PRIORITY_BACKGROUND)
+        print(f"✅ Gemini 워밍업 완료 ({model_name})")
+        return True
+    except Exception as e:
+        logger.warning("Gemini 워밍업 실패: %s", e)
+        return False
+
+
+def choose_prompt_variant():
+    """A/B 실험용 프롬프트 변형 선택 ("full" / "compact")"""
+    return "compact" if random.random() < PROMPT_COMPACT_RATIO else "full"
+
+
+# =========================================================
+# 토큰 사용량 집계 (호출 종류 x 프롬프트 변형)
+# =========================================================
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(call, response, variant="full", elapsed=None):
+    """응답의 usage_metadata 를 로그와 지표에 기록합니다."""
+    meta = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(meta, "prompt_token_count", 0) or 0
+    response_tokens = getattr(meta, "candidates_token_count", 0) or 0
+
+    with _usage_lock:
+        entry = _usage.setdefault(f"{call}:{variant}", {
+            "calls": 0, "prompt_tokens": 0, "response_tokens": 0, "seconds": 0.0,
+        })
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["response_tokens"] += response_tokens
+        entry["seconds"] += elapsed or 0.0
+
+    logger.info(
+        "Gemini 토큰 사용 [%s/%s] prompt=%d response=%d (%.2f초)",
+        call, variant, prompt_tokens, response_tokens, elapsed or 0.0,
+    )
+
+
+def usage_stats():
+    with _usage_lock:
+        result = {}
+        for key, entry in _usage.items():
+            calls = entry["calls"] or 1
+            result[key] = {
+                **entry,
+                "seconds": round(entry["seconds"], 2),
+                "avg_prompt_tokens": round(entry["prompt_tokens"] / calls, 1),
+                "avg_response_tokens": round(entry["response_tokens"] / calls, 1),
+                "avg_seconds": round(entry["seconds"] / calls, 3),
+            }
+        return result
+
+
+def registry_stats():
+    return {"configured": _configured_key is not None, "models": len(_models)}
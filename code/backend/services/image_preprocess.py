@@ -0,0 +1,120 @@
+"""
+Gemini 비전 호출 전 이미지 전처리
+
+휴대폰 원본(12MP 급) 사진을 그대로 올리지 않도록
+    1. PIL draft 로 축소 디코딩 (JPEG 은 원본 해상도 픽셀을 만들지 않음)
+    2. EXIF 회전 정보 적용
+    3. 모드별 최대 해상도로 축소 (OCR 모드는 글자가 뭉개지지 않게 더 크게)
+    4. JPEG / WebP 재인코딩
+을 거쳐 업로드 바이트를 줄입니다. 단계별 소요 시간과 절감 바이트를 로그로 남깁니다.
+"""
+import io
+import logging
+import os
+import threading
+import time
+
+import PIL.Image
+import PIL.ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 글자를 읽어야 하는 모드 (약봉투, 처방전)
+OCR_MODES = {"prescription", "hospital_prescription"}
+
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "True").lower() == "true"
+IMAGE_MAX_SIDE_OCR = int(os.getenv("IMAGE_MAX_SIDE_OCR", "2048"))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()   # JPEG 또는 WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+_lock = threading.Lock()
+_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+
+def max_side_for(mode):
+    return IMAGE_MAX_SIDE_OCR if mode in OCR_MODES else IMAGE_MAX_SIDE
+
+
+def preprocess_image(raw, mode):
+    """
+    이미지 바이트를 Gemini 업로드용으로 줄입니다.
+
+    Args:
+        raw (bytes): 원본 이미지 바이트
+        mode (str): 분석 모드 (최대 해상도 결정)
+
+    Returns:
+        dict: {"mime_type": ..., "data": bytes} - generate_content 에 그대로 전달 가능
+    """
+    timings = {}
+    started = last = time.perf_counter()
+
+    def _mark(step):
+        nonlocal last
+        now = time.perf_counter()
+        timings[step] = round((now - last) * 1000, 1)
+        last = now
+
+    img = PIL.Image.open(io.BytesIO(raw))
+    source_format = img.format
+    max_side = max_side_for(mode)
+    _mark("open")
+
+    # 1. 축소 디코딩: JPEG 은 1/2, 1/4, 1/8 스케일로 바로 디코딩 (max_side 이상 유지)
+    if source_format == "JPEG":
+        img.draft("RGB", (max_side, max_side))
+    img.load()
+    _mark("decode")
+
+    # 2. EXIF 회전 적용 (세로로 찍은 약봉투가 옆으로 누워 OCR 되는 것 방지)
+    rotated = img.getexif().get(0x0112, 1) != 1   # 0x0112 = Orientation
+    if rotated:
+        img = PIL.ImageOps.exif_transpose(img)
+    _mark("exif")
+
+    # 3. 모드별 최대 해상도로 축소
+    resized = max(img.size) > max_side
+    if resized:
+        img.thumbnail((max_side, max_side), PIL.Image.LANCZOS)
+    _mark("resize")
+
+    # 4. 재인코딩
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    save_kwargs = {"quality": IMAGE_QUALITY}
+    if IMAGE_FORMAT == "JPEG":
+        save_kwargs["optimize"] = True
+    img.save(out, format=IMAGE_FORMAT, **save_kwargs)
+    data = out.getvalue()
+    mime_type = _MIME_TYPES.get(IMAGE_FORMAT, "image/jpeg")
+    _mark("encode")
+
+    # 이미 작은 이미지라 재인코딩이 오히려 커지면 원본 사용
+    if len(data) >= len(raw) and not (resized or rotated) and source_format in _MIME_TYPES:
+        data, mime_type = raw, _MIME_TYPES[source_format]
+
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _stats["images"] += 1
+        _stats["bytes_in"] += len(raw)
+        _stats["bytes_out"] += len(data)
+        _stats["seconds"] += elapsed
+
+    saved = len(raw) - len(data)
+    logger.info(
+        "이미지 전처리 (%s): %d -> %d bytes (%.0f%% 절감), %dx%d, 단계별 ms=%s",
+        mode, len(raw), len(data), 100 * saved / len(raw) if raw else 0, img.size[0], img.size[1], timings,
+    )
+    return {"mime_type": mime_type, "data": data}
+
+
+def preprocess_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    stats["avg_ms"] = round(stats["seconds"] * 1000 / stats["images"], 1) if stats["images"] else 0.0
+    return stats
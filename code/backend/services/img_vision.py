@@ -1,38 +1,175 @@
 import os
+import io
 import json
+import time
+import hashlib
 import PIL.Image
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 # 1. 환경 변수 로드 (.env 파일에 GEMINI_API_KEY가 있어야 합니다)
 load_dotenv()
 
-# 2. Gemini API 설정
-API_KEY = os.getenv("GEMINI_API_KEY")
+from services.gemini_client import get_model, is_configured, choose_prompt_variant, record_usage
+from services.image_preprocess import IMAGE_PREPROCESS_ENABLED, preprocess_image
+from services.memory_cache import CompressedLRU
+from services.llm_scheduler import scheduler, PRIORITY_STANDARD
+from services.food_rules import evaluate as evaluate_food_rules
 
-if not API_KEY or API_KEY == "YOUR_GEMINI_API_KEY":
+# 2. Gemini API 설정 (설정/모델 생성은 gemini_client 레지스트리가 한 번만 수행)
+if not is_configured():
     print("❌ 에러: API 키를 찾을 수 없습니다. .env 파일을 확인하세요.")
-else:
-    genai.configure(api_key=API_KEY)
 
-def analyze_health_image(image_path, mode="prescription", current_pill="알약명"):
+# 3. 분석 결과 캐시 (같은 사진 재업로드 시 Gemini 호출 생략)
+VISION_CACHE_TTL = float(os.getenv("VISION_CACHE_TTL_MIN", "1440")) * 60
+VISION_CACHE_MAX = int(os.getenv("VISION_CACHE_MAX", "512"))
+
+_vision_cache = CompressedLRU(
+    "vision_result",
+    max_entries=VISION_CACHE_MAX,
+    max_bytes=8 * 1024 * 1024,
+    ttl=VISION_CACHE_TTL,
+)
+
+def _vision_cache_key(raw, mode, digest=None):
+    # 음식 모드도 인식 결과만 캐시하므로 복용 약 목록과 무관 (경고는 규칙 테이블이 매번 계산)
+    # digest: 업로드를 읽으면서 미리 계산한 sha256 (있으면 다시 해시하지 않음)
+    return f"{digest or hashlib.sha256(raw).hexdigest()}:{mode}"
+
+def _with_food_verdict(result, mode, current_pill):
+    """음식 모드: 인식된 식재료와 복용 약으로 규칙 테이블 판정 결과를 붙입니다."""
+    if mode != "food" or not isinstance(result, dict) or "error" in result:
+        return result
+    verdict = evaluate_food_rules(result.get("main_ingredients", []), current_pill)
+    return {**result, "type": "food_interaction_analysis", **verdict}
+
+def vision_cache_stats():
+    return _vision_cache.stats()
+
+# 4. 모드별 응답 스키마 (Gemini 구조화 출력 - 코드 블록/잘못된 JSON 방지)
+VISION_STRUCTURED_OUTPUT = os.getenv("VISION_STRUCTURED_OUTPUT", "True").lower() == "true"
+
+_DRUG_ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "effect": {"type": "STRING"},
+        "administer_method": {"type": "STRING"},
+    },
+    "required": ["name"],
+}
+
+RESPONSE_SCHEMAS = {
+    "prescription": {
+        "type": "OBJECT",
+        "properties": {
+            "medications": {"type": "ARRAY", "items": _DRUG_ITEM_SCHEMA},
+            "precautions": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "schedule": {"type": "STRING"},
+        },
+        "required": ["medications"],
+    },
+    "hospital_prescription": {
+        "type": "OBJECT",
+        "properties": {
+            "patient": {
+                "type": "OBJECT",
+                "properties": {"name": {"type": "STRING"}, "dob": {"type": "STRING"}},
+            },
+            "diagnosis_codes": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "prescribed_drugs": {"type": "ARRAY", "items": _DRUG_ITEM_SCHEMA},
+            "institution": {"type": "STRING"},
+        },
+        "required": ["prescribed_drugs"],
+    },
+    "pill": {
+        "type": "OBJECT",
+        "properties": {
+            "pills": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "name": {"type": "STRING"},
+                        "imprint": {"type": "STRING"},
+                        "color": {"type": "STRING"},
+                        "shape": {"type": "STRING"},
+                    },
+                    "required": ["name"],
+                },
+            },
+        },
+        "required": ["pills"],
+    },
+    "food": {
+        "type": "OBJECT",
+        "properties": {
+            "type": {"type": "STRING"},
+            "detected_items": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "main_ingredients": {"type": "ARRAY", "items": {"type": "STRING"}},
+        },
+        "required": ["detected_items", "main_ingredients"],
+    },
+}
+
+def _generation_config(mode):
+    if not VISION_STRUCTURED_OUTPUT or mode not in RESPONSE_SCHEMAS:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMAS[mode]}
+
+def _compact_prompt(mode):
+    """
+    토큰 절감용 압축 프롬프트.
+    구조화 출력이 꺼져 있어도 같은 키로 응답하도록 키 이름을 프롬프트에 직접 적습니다.
+    """
+    if mode == "prescription":
+        return (
+            '약봉투 사진입니다. JSON {"medications":[{"name","effect","administer_method"}],'
+            '"precautions":[문자열],"schedule":문자열} 로만 답하세요.'
+        )
+    if mode == "hospital_prescription":
+        return (
+            '병원 처방전 사진입니다. JSON {"patient":{"name","dob"},"diagnosis_codes":[문자열],'
+            '"prescribed_drugs":[{"name","administer_method","effect"}],"institution":문자열} 로만 답하세요.'
+        )
+    if mode == "pill":
+        return '알약 사진입니다. JSON {"pills":[{"name","imprint","color","shape"}]} 로만 답하세요.'
+    return '음식 사진입니다. JSON {"detected_items":[음식명],"main_ingredients":[식재료, 예: 대두, 우유, 자몽]} 로만 답하세요.'
+
+def analyze_health_image(image_path, mode="prescription", current_pill="알약명", priority=PRIORITY_STANDARD, digest=None):
     """
-    이미지 분석 수행 (약봉투, 병원 처방전, 음식 및 약물 상호작용 분석)
+    이미지 분석 수행 (약봉투, 병원 처방전, 음식 및 약물 상호작용 분석, 알약 식별)
     
     Args:
-        image_path (str): 이미지 파일 경로
-        mode (str): 'prescription'(약봉투), 'hospital_prescription'(처방전), 'food'(음식분석)
-        current_pill (str): 사용자가 현재 복용 중인 약 이름 (음식 모드에서 경고 문구 생성용)
+        image_path (str | bytes): 이미지 파일 경로 또는 이미지 바이트
+        mode (str): 'prescription'(약봉투), 'hospital_prescription'(처방전), 'food'(음식분석), 'pill'(알약 식별)
+        current_pill (str): 사용자가 현재 복용 중인 약 이름 (음식 모드에서 규칙 테이블 판정용)
+        priority (int): LLM 스케줄러 우선순위 레인
+        digest (str): 이미지 바이트의 sha256 hex (호출 측에서 이미 계산한 경우)
     """
     try:
-        if not os.path.exists(image_path):
-            return {"error": f"파일을 찾을 수 없습니다: {image_path}"}
-        img = PIL.Image.open(image_path)
+        if isinstance(image_path, (bytes, bytearray)):
+            raw = bytes(image_path)
+        else:
+            if not os.path.exists(image_path):
+                return {"error": f"파일을 찾을 수 없습니다: {image_path}"}
+            with open(image_path, "rb") as f:
+                raw = f.read()
     except Exception as e:
         return {"error": f"이미지 로드 실패: {e}"}
 
-    # 모델 설정 (멀티모달에 최적화된 1.5 Flash 사용)
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    cache_key = _vision_cache_key(raw, mode, digest)
+    cached = _vision_cache.get(cache_key)
+    if cached is not None:
+        return _with_food_verdict(cached, mode, current_pill)
+
+    try:
+        if IMAGE_PREPROCESS_ENABLED:
+            # 축소/재인코딩한 바이트를 업로드 (원본 해상도 그대로 보내지 않음)
+            img = preprocess_image(raw, mode)
+        else:
+            img = PIL.Image.open(io.BytesIO(raw))
+    except Exception as e:
+        return {"error": f"이미지 로드 실패: {e}"}
 
     # 3. 모드별 프롬프트 설정
     if mode == "prescription":  # [모드 1: 약국 약봉투]
@@ -76,42 +213,69 @@ def analyze_health_image(image_path, mode="prescription", current_pill="알약
         주의: 반드시 유효한 JSON이어야 합니다.
         """
 
-    elif mode == "food":  # [모드 3: 음식 성분 및 약물 상호작용 경고]
-        prompt = f"""
+    elif mode == "pill":  # [모드 4: 알약 낱알 식별 - 로컬 탐지기 신뢰도가 낮을 때만 사용]
+        prompt = """
+        이 이미지는 '알약' 사진입니다. 알약의 각인(글자/숫자), 색상, 모양을 보고 제품을 식별해 다음 JSON 형식으로 출력해주세요.
+        
+        응답 형식 (JSON):
+        {
+            "pills": [
+                {
+                    "name": "제품명 (예: 타이레놀정500밀리그램)",
+                    "imprint": "각인 (예: TYLENOL 500)",
+                    "color": "색상",
+                    "shape": "모양 (예: 장방형)"
+                }
+            ]
+        }
+        
+        주의: 반드시 유효한 JSON이어야 합니다.
+        """
+
+    elif mode == "food":  # [모드 3: 음식 성분 인식 - 약물 상호작용 판정은 food_rules 규칙 테이블]
+        prompt = """
         이 사진 속 음식을 인식하고, 포함된 주요 식재료 성분을 분석해줘.
-        특히 사용자가 복용 중인 '{current_pill}'과 상호작용할 위험이 있는 성분을 찾는 것이 핵심이야.
+        복용 약과의 상호작용 판정에 쓰이므로 대두, 우유, 자몽, 술, 시금치처럼 성분을 빠짐없이 적어줘.
 
         [응답 규칙]
         1. detected_items: 인식된 음식 이름 리스트.
         2. main_ingredients: 들어간 주요 식재료 성분 (예: 대두, 우유, 자몽 등).
-        3. warning_message: 식재료 중 '{current_pill}'과 충돌할 수 있는 성분(예: 대두)이 있다면, 
-           "사진 속 음식에 포함된 '성분명'은 현재 복용 중인 {current_pill}과 먹으면 위험하오니 피하는 것이 좋을 것 같아요" 
-           느낌으로 친절한 경고 문구를 작성해줘. 위험 성분이 없으면 "특이사항 없습니다."라고 해줘.
 
         응답 형식:
-        {{
-          "type": "food_interaction_analysis",
+        {
           "detected_items": ["음식명"],
-          "main_ingredients": ["성분1", "성분2"],
-          "warning_message": "경고 메시지 내용"
-        }}
+          "main_ingredients": ["성분1", "성분2"]
+        }
         """
 
     else:
         return {"error": "지원하지 않는 모드입니다."}
 
+    variant = choose_prompt_variant()
+    if variant == "compact":
+        prompt = _compact_prompt(mode)
+
+    # 모델 설정 (공유 레지스트리에서 재사용, 모드별 스키마 강제 JSON 출력)
+    model = get_model(generation_config=_generation_config(mode))
+
     try:
         # 모델 분석 실행
-        response = model.generate_content([prompt, img])
+        started = time.perf_counter()
+        response = scheduler.call(model.generate_content, [prompt, img], priority=priority)
+        record_usage(f"vision_{mode}", response, variant, time.perf_counter() - started)
         content = response.text.strip()
         
-        # JSON 파싱 안정화 로직
+        # JSON 파싱 안정화 로직 (구조화 출력이 꺼져 있거나 모델이 무시한 경우 대비)
         if "```json" in content:
             content = content.split("```json")[1].split("```")[0].strip()
         elif "```" in content:
             content = content.split("```")[1].split("```")[0].strip()
             
-        return json.loads(content)
+        result = json.loads(content)
+        # 에러 응답(raw_content 포함)은 캐시하지 않음 -> 재업로드 시 다시 분석
+        if not (isinstance(result, dict) and ("error" in result or "raw_content" in result)):
+            _vision_cache.set(cache_key, result)
+        return _with_food_verdict(result, mode, current_pill)
     except Exception as e:
         return {"error": f"분석 또는 파싱 실패: {str(e)}", "raw_content": content if 'content' in locals() else None}
 
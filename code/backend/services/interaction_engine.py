@@ -0,0 +1,302 @@
+"""
+복용 약물 간 병용금기 검사 엔진
+
+사용자가 등록한 모든 약을 쌍(pair)으로 묶어 미리 만들어 둔 병용금기 인덱스와
+대조합니다. LLM 호출 없이 밀리초 단위로 위험 조합을 찾아냅니다.
+
+인덱스 출처:
+    1. 오프라인 DUR 저장소(dur_local)의 병용금기 전체 행
+    2. drug_cache 에 저장된 리포트들의 병용금기 항목
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from itertools import combinations
+
+from database import iter_cached_reports
+from services import dur_local
+from services.memory_cache import CompressedLRU
+
+logger = logging.getLogger(__name__)
+
+MIXTURE_CATEGORY = "병용금기"
+
+# 인덱스 재구축 주기 (drug_cache 에 새로 쌓인 리포트 반영)
+INTERACTION_INDEX_REFRESH = float(os.getenv("INTERACTION_INDEX_REFRESH_MIN", "60")) * 60
+
+# 약 조합별 결과 캐시
+INTERACTION_CACHE_TTL = float(os.getenv("INTERACTION_CACHE_TTL_MIN", "60")) * 60
+INTERACTION_CACHE_MAX = int(os.getenv("INTERACTION_CACHE_MAX", "1024"))
+
+_result_cache = CompressedLRU(
+    "drug_interactions",
+    max_entries=INTERACTION_CACHE_MAX,
+    max_bytes=4 * 1024 * 1024,
+    ttl=INTERACTION_CACHE_TTL,
+)
+
+
+def _norm_name(name):
+    return "".join(str(name or "").split())
+
+
+class PairIndex:
+    """병용금기 쌍 인덱스 (품목코드 / 제품명 / 성분코드 세 가지 기준)"""
+
+    def __init__(self):
+        self.by_seq = {}
+        self.by_name = {}
+        self.by_ingredient = {}
+        self.ingredients = {}    # 품목코드 또는 제품명 -> {성분코드}
+        self.name_to_seq = {}
+        self.known_seqs = set()   # 병용금기 행에 한 번이라도 나온 품목코드
+        self.known_names = set()
+        self.ingredient_names = {}   # 품목코드 또는 제품명 -> {성분명} (음식 상호작용 판정용)
+        self.version = None
+        self.built_at = 0.0
+
+    def add_row(self, row):
+        seq = str(row.get("ITEM_SEQ") or "").strip()
+        mix_seq = str(row.get("MIXTURE_ITEM_SEQ") or "").strip()
+        name = _norm_name(row.get("ITEM_NAME"))
+        mix_name = _norm_name(row.get("MIXTURE_ITEM_NAME"))
+        ingr = str(row.get("INGR_CODE") or "").strip()
+        mix_ingr = str(row.get("MIXTURE_INGR_CODE") or "").strip()
+
+        info = {
+            "reason": row.get("PROHBT_CONTENT") or row.get("REMARK") or "병용금기",
+            "ingredient_a": row.get("INGR_KOR_NAME") or row.get("INGR_NAME"),
+            "ingredient_b": row.get("MIXTURE_INGR_KOR_NAME") or row.get("MIXTURE_INGR_NAME"),
+        }
+        if seq and mix_seq:
+            self.by_seq[(seq, mix_seq)] = info
+        if name and mix_name:
+            self.by_name[(name, mix_name)] = info
+        if ingr and mix_ingr:
+            self.by_ingredient[(ingr, mix_ingr)] = info
+
+        for key_seq, key_name, key_ingr in ((seq, name, ingr), (mix_seq, mix_name, mix_ingr)):
+            if key_seq:
+                self.known_seqs.add(key_seq)
+            if key_name:
+                self.known_names.add(key_name)
+            if key_seq and key_name:
+                self.name_to_seq.setdefault(key_name, key_seq)
+            if key_ingr:
+                for key in (key_seq, key_name):
+                    if key:
+                        self.ingredients.setdefault(key, set()).add(key_ingr)
+
+    def add_ingredient_names(self, row):
+        """DUR 행(모든 카테고리)에서 약 -> 성분명 매핑을 모읍니다."""
+        names = dur_local.row_ingredient_names(row)
+        if not names:
+            return
+        for key in (str(row.get("ITEM_SEQ") or "").strip(), _norm_name(row.get("ITEM_NAME"))):
+            if key:
+                self.ingredient_names.setdefault(key, set()).update(names)
+
+    def find_ingredient_names(self, drug_name, item_seq=None):
+        """제품명(정확히 또는 접두 일치) / 품목코드로 성분명 집합을 찾습니다."""
+        name = _norm_name(drug_name)
+        seq = str(item_seq or "").strip()
+        names = set(self.ingredient_names.get(seq, ())) | set(self.ingredient_names.get(name, ()))
+        if not names and name:
+            for key, values in self.ingredient_names.items():
+                if key.startswith(name):
+                    names |= values
+        return names
+
+    def resolve(self, drug_name, item_seq=None, label_map_names=None):
+        """사용자 약 1건을 (품목코드, 정규화 이름, 성분코드 집합) 으로 식별합니다."""
+        name = _norm_name(drug_name)
+        seq = str(item_seq or "").strip()
+        if not seq:
+            seq = (label_map_names or {}).get(name) or self.name_to_seq.get(name, "")
+        ingredients = self.ingredients.get(seq, set()) | self.ingredients.get(name, set())
+        return seq, name, ingredients
+
+    def is_known(self, drug):
+        """인덱스에 실제로 행이 있는 약인지 (매핑 파일에서 품목코드만 얻은 경우는 제외)"""
+        seq, name, ingredients = drug
+        return bool(ingredients) or seq in self.known_seqs or name in self.known_names
+
+    def _lookup(self, table, a, b):
+        if not a or not b:
+            return None
+        return table.get((a, b)) or table.get((b, a))
+
+    def match(self, drug_a, drug_b):
+        """두 약의 병용금기 여부. (matched_by, info) 또는 None"""
+        seq_a, name_a, ingr_a = drug_a
+        seq_b, name_b, ingr_b = drug_b
+
+        info = self._lookup(self.by_seq, seq_a, seq_b)
+        if info:
+            return "item_seq", info
+        info = self._lookup(self.by_name, name_a, name_b)
+        if info:
+            return "item_name", info
+        for a in ingr_a:
+            for b in ingr_b:
+                info = self._lookup(self.by_ingredient, a, b)
+                if info:
+                    return "ingredient", info
+        return None
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "built_at": self.built_at,
+            "seq_pairs": len(self.by_seq),
+            "name_pairs": len(self.by_name),
+            "ingredient_pairs": len(self.by_ingredient),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()   # _index / _rebuilding 보호 (짧게만 잡음)
+_build_lock = threading.Lock()   # 구축은 한 번에 하나만
+_rebuilding = False
+
+
+def _build_index():
+    started = time.perf_counter()
+    index = PairIndex()
+
+    local_info = dur_local.get_version()
+    for row in dur_local.iter_category(MIXTURE_CATEGORY):
+        index.add_row(row)
+        index.add_ingredient_names(row)
+
+    cached_reports = 0
+    try:
+        for _, _, report in iter_cached_reports():
+            for category, rows in (report.get("safety") or {}).items():
+                for row in rows or []:
+                    if category == MIXTURE_CATEGORY:
+                        index.add_row(row)
+                    index.add_ingredient_names(row)
+            cached_reports += 1
+    except Exception as e:
+        logger.warning("drug_cache 에서 병용금기 인덱스 구축 실패: %s", e)
+
+    local_version = (local_info or {}).get("version", "none")
+    index.version = f"{local_version}+cache{cached_reports}"
+    index.built_at = time.time()
+    print(f"✅ 병용금기 인덱스 구축: {index.stats()} ({time.perf_counter() - started:.2f}초)")
+    return index
+
+
+def _rebuild():
+    global _index, _rebuilding
+    try:
+        with _build_lock:
+            index = _build_index()
+        with _index_lock:
+            _index = index
+    except Exception as e:
+        logger.warning("병용금기 인덱스 구축 실패: %s", e)
+    finally:
+        with _index_lock:
+            _rebuilding = False
+
+
+def start_index_build():
+    """백그라운드 스레드에서 인덱스를 (다시) 만듭니다. 이미 구축 중이면 아무것도 하지 않습니다."""
+    global _rebuilding
+    with _index_lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, name="interaction-index", daemon=True).start()
+
+
+def get_index():
+    """
+    인덱스를 반환합니다. 저장소 버전이 바뀌었거나 오래되었으면 기존 인덱스를 그대로 쓰면서
+    백그라운드에서 다시 만듭니다. 아직 한 번도 만들지 않았을 때만 구축을 기다립니다.
+    """
+    global _index
+    with _index_lock:
+        index = _index
+    if index is None:
+        # 시작 시 백그라운드 구축이 돌고 있으면 _build_lock 에서 그 완료를 기다림
+        with _build_lock:
+            with _index_lock:
+                index = _index
+            if index is None:
+                index = _build_index()
+                with _index_lock:
+                    _index = index
+        return index
+
+    local_version = (dur_local.get_version() or {}).get("version", "none")
+    stale = (
+        not index.version.startswith(local_version + "+")
+        or time.time() - index.built_at > INTERACTION_INDEX_REFRESH
+    )
+    if stale:
+        start_index_build()
+    return index
+
+
+def check_drug_set(drugs, label_map=None):
+    """
+    약 목록의 모든 쌍을 병용금기 인덱스와 대조합니다.
+
+    Args:
+        drugs (list): [(drug_name, item_seq), ...] - item_seq 는 None 가능
+        label_map (dict): drug_mapping.json (제품명으로 품목코드를 찾는 데 사용)
+
+    Returns:
+        dict: 위험 조합 목록과 검사 요약
+    """
+    started = time.perf_counter()
+    index = get_index()
+
+    # 같은 약 조합이면 같은 결과 -> 정렬된 약 집합의 해시를 키로 캐시
+    unique = sorted({(_norm_name(name), str(seq or "").strip()) for name, seq in drugs if name})
+    digest = hashlib.sha1(json.dumps([index.version, unique], ensure_ascii=False).encode("utf-8")).hexdigest()
+    cached = _result_cache.get(digest)
+    if cached is not None:
+        cached["cached"] = True
+        cached["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return cached
+
+    label_map_names = {_norm_name(meta.get("name")): meta.get("code") for meta in (label_map or {}).values()}
+    display = {}
+    for name, seq in drugs:
+        if name:
+            display.setdefault((_norm_name(name), str(seq or "").strip()), name)
+    resolved = [(display[key], index.resolve(key[0], key[1], label_map_names)) for key in unique]
+
+    interactions = []
+    for (name_a, drug_a), (name_b, drug_b) in combinations(resolved, 2):
+        hit = index.match(drug_a, drug_b)
+        if hit:
+            matched_by, info = hit
+            interactions.append({"drug_a": name_a, "drug_b": name_b, "matched_by": matched_by, **info})
+
+    # 인덱스에서 전혀 식별되지 않은 약 (결과가 '안전'을 뜻하지 않음을 알리기 위함)
+    unresolved = [name for name, drug in resolved if not index.is_known(drug)]
+
+    result = {
+        "drug_count": len(resolved),
+        "pairs_checked": len(resolved) * (len(resolved) - 1) // 2,
+        "interactions": interactions,
+        "unresolved": unresolved,
+        "index_version": index.version,
+    }
+    _result_cache.set(digest, result)
+    return {**result, "cached": False, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+def engine_stats():
+    return {
+        "index": _index.stats() if _index is not None else None,
+        "result_cache": _result_cache.stats(),
+    }
@@ -0,0 +1,201 @@
+"""
+비동기 이미지 분석 작업 큐
+
+업로드 요청은 작업을 SQLite(jobs 테이블)에 기록하고 job_id 만 바로 돌려줍니다.
+실제 분석은 웹 요청과 별개로 크기를 정하는 로컬 워커 풀에서 실행되고,
+클라이언트는 GET /jobs/{job_id} 폴링 또는 WebSocket 으로 결과를 받습니다.
+
+작업은 실행 전에 DB 에서 원자적으로 점유(owner + lease)하므로 uvicorn 워커가 여러 개여도
+한 번만 실행됩니다. 점유한 프로세스가 죽으면 lease 가 지난 뒤 다른 워커(또는 재시작한 서버)가
+이어서 실행하고, JOB_MAX_ATTEMPTS 번 중단된 작업은 실패 처리합니다.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database import (
+    create_job, update_job, get_job, claim_job, get_claimable_jobs, fail_exhausted_jobs, delete_finished_jobs,
+)
+from services.blocking_pool import run_blocking
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# 끝난 작업을 jobs 테이블에 남겨 두는 시간
+JOB_RETENTION = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+# 점유 기한: 가장 오래 걸리는 분석보다 길어야 함 (지나면 다른 워커가 이어서 실행)
+JOB_LEASE = float(os.getenv("JOB_LEASE_SEC", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# 죽은 워커가 남긴 작업을 찾는 주기
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_SEC", "60"))
+# WebSocket 구독 중 DB 를 다시 읽는 주기 (다른 프로세스에서 실행되는 작업은 알림이 오지 않음)
+JOB_WATCH_POLL = float(os.getenv("JOB_WATCH_POLL_SEC", "1"))
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._handlers = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper = None
+        self._watchers = {}   # job_id -> [(loop, asyncio.Queue), ...]
+        self._stats = {
+            "submitted": 0, "recovered": 0, "claim_lost": 0, "abandoned": 0,
+            "running": 0, "done": 0, "failed": 0, "seconds": 0.0,
+        }
+
+    def register_handler(self, kind, handler):
+        """
+        handler(job_id: str, payload: bytes, params: dict) -> dict (워커 스레드에서 실행)
+        lease 만료 후 재실행될 수 있으므로 부작용은 job_id 기준으로 멱등이어야 합니다.
+        """
+        self._handlers[kind] = handler
+
+    # ---------- 제출 / 재개 ----------
+    def submit(self, kind, payload, params=None):
+        if kind not in self._handlers:
+            raise ValueError(f"등록되지 않은 작업 종류입니다: {kind}")
+        job_id = uuid.uuid4().hex
+        create_job(job_id, kind, params or {}, payload)
+        with self._lock:
+            self._stats["submitted"] += 1
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        """
+        시작 시: 오래된 작업을 정리하고, 점유할 수 있는 작업(대기 중 / lease 만료)을 큐에 넣은 뒤
+        주기적으로 같은 일을 하는 스윕 스레드를 띄웁니다.
+        """
+        deleted = delete_finished_jobs(time.time() - JOB_RETENTION)
+        pending = self._sweep()
+        if pending or deleted:
+            print(f"✅ 작업 큐 복구: 재실행 후보 {pending}건, 정리 {deleted}건")
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="job-sweeper", daemon=True)
+            self._sweeper.start()
+        return pending
+
+    def _sweep(self):
+        abandoned = fail_exhausted_jobs(JOB_MAX_ATTEMPTS)
+        pending = get_claimable_jobs()
+        for job_id in pending:
+            # 실제 실행 여부는 _run 의 점유(claim) 결과로 결정
+            self._executor.submit(self._run, job_id)
+        with self._lock:
+            self._stats["recovered"] += len(pending)
+            self._stats["abandoned"] += abandoned
+        return len(pending)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(JOB_SWEEP_INTERVAL):
+            try:
+                self._sweep()
+            except Exception as e:
+                logger.warning("작업 큐 스윕 실패: %s", e)
+
+    # ---------- 실행 ----------
+    def _run(self, job_id):
+        claimed = claim_job(job_id, self.owner, JOB_LEASE, JOB_MAX_ATTEMPTS)
+        if claimed is None:
+            # 다른 워커가 이미 점유했거나 끝난 작업
+            with self._lock:
+                self._stats["claim_lost"] += 1
+            return
+        kind, params, payload = claimed
+        handler = self._handlers.get(kind)
+        self._notify(job_id)
+        with self._lock:
+            self._stats["running"] += 1
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise ValueError(f"등록되지 않은 작업 종류입니다: {kind}")
+            result = handler(job_id, payload, params)
+            status, error = "done", None
+        except Exception as e:
+            logger.exception("작업 %s (%s) 실패", job_id, kind)
+            result, status, error = None, "failed", str(e)
+
+        if not update_job(job_id, status, result=result, error=error, owner=self.owner):
+            # lease 가 지나 다른 워커가 다시 점유함: 그쪽 결과를 따름
+            logger.warning("작업 %s 의 점유를 잃어 결과를 기록하지 않습니다.", job_id)
+        with self._lock:
+            self._stats["running"] -= 1
+            self._stats[status] += 1
+            self._stats["seconds"] += time.perf_counter() - started
+        self._notify(job_id)
+
+    # ---------- 결과 전달 ----------
+    def get(self, job_id):
+        return get_job(job_id)
+
+    def _notify(self, job_id):
+        with self._lock:
+            watchers = list(self._watchers.get(job_id, ()))
+        if not watchers:
+            return
+        job = get_job(job_id)
+        for loop, queue in watchers:
+            loop.call_soon_threadsafe(queue.put_nowait, job)
+
+    async def watch(self, job_id):
+        """
+        작업 상태가 바뀔 때마다 yield 합니다. 현재 상태부터 시작해 끝나면 멈춥니다.
+        작업이 없으면 아무것도 yield 하지 않습니다.
+        이 프로세스에서 실행되는 작업은 _notify 로 바로 받고, 다른 uvicorn 워커가 실행하거나
+        lease 를 이어받은 작업은 JOB_WATCH_POLL 초마다 DB 를 다시 읽어 확인합니다.
+        """
+        queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._watchers.setdefault(job_id, []).append(entry)
+        try:
+            # 구독 후에 현재 상태를 읽어야 그 사이에 끝난 작업을 놓치지 않음
+            job = await run_blocking(get_job, job_id)
+            last = None
+            while job is not None:
+                if job != last:
+                    yield job
+                    last = job
+                if job["status"] in FINISHED_STATUSES:
+                    break
+                try:
+                    job = await asyncio.wait_for(queue.get(), JOB_WATCH_POLL)
+                except asyncio.TimeoutError:
+                    job = await run_blocking(get_job, job_id)
+        finally:
+            with self._lock:
+                watchers = self._watchers.get(job_id, [])
+                if entry in watchers:
+                    watchers.remove(entry)
+                if not watchers:
+                    self._watchers.pop(job_id, None)
+
+    def stats(self):
+        with self._lock:
+            finished = self._stats["done"] + self._stats["failed"]
+            return {
+                **{k: v for k, v in self._stats.items() if k != "seconds"},
+                "workers": self.workers,
+                "watchers": sum(len(v) for v in self._watchers.values()),
+                "avg_seconds": round(self._stats["seconds"] / finished, 3) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        # 실행 중인 작업은 DB 에 running 으로 남아 lease 가 지나면 다시 실행됨
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_queue = JobQueue()
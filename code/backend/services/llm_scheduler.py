@@ -0,0 +1,256 @@
+"""
+LLM / 비전 호출 스케줄러
+
+모든 Gemini 호출이 이곳을 거쳐 나갑니다.
+    - 전역 동시 실행 수 제한
+    - 우선순위 레인 (대화형 /consult 가 백그라운드 작업보다 먼저)
+    - 재시도 가능한 오류에 지수 백오프 + 지터 재시도
+    - 업스트림이 불안정하면 빠르게 실패하는 서킷 브레이커
+"""
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 우선순위 레인 (숫자가 작을수록 먼저)
+PRIORITY_INTERACTIVE = 0   # /consult 등 사용자가 화면 앞에서 기다리는 호출
+PRIORITY_STANDARD = 1      # 이미지 업로드 분석
+PRIORITY_BACKGROUND = 2    # 워밍업, 비동기 작업 등
+
+LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_STANDARD: "standard", PRIORITY_BACKGROUND: "background"}
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE_SEC", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX_SEC", "8"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+try:
+    from google.api_core import exceptions as _gexc
+    _RETRYABLE_TYPES = (
+        _gexc.TooManyRequests, _gexc.ResourceExhausted, _gexc.ServiceUnavailable,
+        _gexc.InternalServerError, _gexc.DeadlineExceeded, _gexc.GatewayTimeout,
+    )
+except ImportError:  # google-api-core 가 없는 환경
+    _RETRYABLE_TYPES = ()
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷 브레이커가 열려 있어 호출하지 않고 바로 실패"""
+
+
+def is_retryable(error):
+    if _RETRYABLE_TYPES and isinstance(error, _RETRYABLE_TYPES):
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in _RETRYABLE_STATUS
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 breaker_failures=LLM_BREAKER_FAILURES, breaker_cooldown=LLM_BREAKER_COOLDOWN):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+
+        self._cond = threading.Condition()
+        self._waiting = []          # (priority, 순번) 힙
+        self._seq = itertools.count()
+        self._running = 0
+
+        # 서킷 브레이커 상태: closed -> open -> half_open -> closed
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self._stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "retries": 0,
+            "rejected": 0, "breaker_trips": 0, "wait_total": 0.0,
+        }
+
+    # ---------- 동시 실행 슬롯 ----------
+    def _acquire(self, priority):
+        ticket = (priority, next(self._seq))
+        started = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while self._running >= self.max_concurrency or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._running += 1
+            self._stats["wait_total"] += time.perf_counter() - started
+            # 다음 순번이 빈 슬롯을 바로 잡을 수 있도록 깨움
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    # ---------- 서킷 브레이커 ----------
+    def _before_call(self):
+        """열려 있으면 CircuitOpenError. 쿨다운이 지나면 탐색 호출 1건만 허용"""
+        with self._cond:
+            if self._state == "open":
+                if time.time() - self._opened_at < self.breaker_cooldown:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError("Gemini 호출이 일시적으로 차단되었습니다. 잠시 후 다시 시도하세요.")
+                self._state = "half_open"
+            if self._state == "half_open":
+                if self._probe_in_flight:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError("Gemini 상태 확인 중입니다. 잠시 후 다시 시도하세요.")
+                self._probe_in_flight = True
+
+    def _on_success(self):
+        with self._cond:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            if self._state != "closed":
+                logger.info("LLM 서킷 브레이커 닫힘 (업스트림 회복)")
+            self._state = "closed"
+
+    def _on_failure(self, retryable):
+        if not retryable:
+            # 잘못된 요청 등: 업스트림은 정상 응답한 것이므로 브레이커 관점에서는 성공
+            self._on_success()
+            return
+        with self._cond:
+            self._probe_in_flight = False
+            self._consecutive_failures += 1
+            if self._state == "half_open" or self._consecutive_failures >= self.breaker_failures:
+                if self._state != "open":
+                    self._stats["breaker_trips"] += 1
+                    logger.warning("LLM 서킷 브레이커 열림 (연속 실패 %d회)", self._consecutive_failures)
+                self._state = "open"
+                self._opened_at = time.time()
+
+    def _backoff(self, attempt):
+        # full jitter: 0 ~ min(최대, 기본 * 2^attempt)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # ---------- 공개 API ----------
+    def call(self, fn, *args, priority=PRIORITY_STANDARD, **kwargs):
+        """
+        fn(*args, **kwargs) 를 스케줄러 규칙에 따라 실행하고 결과를 반환합니다.
+
+        Raises:
+            CircuitOpenError: 서킷 브레이커가 열려 있을 때
+            Exception: 재시도 불가 오류 또는 재시도 소진 시 마지막 오류
+        """
+        with self._cond:
+            self._stats["submitted"] += 1
+
+        attempt = 0
+        while True:
+            self._before_call()
+            self._acquire(priority)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._release()
+                retryable = is_retryable(e)
+                self._on_failure(retryable)
+                if not retryable or attempt >= self.max_retries:
+                    with self._cond:
+                        self._stats["failed"] += 1
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                logger.warning("LLM 호출 재시도 %d/%d (%.2f초 후): %s", attempt, self.max_retries, delay, e)
+                time.sleep(delay)
+                continue
+
+            self._release()
+            self._on_success()
+            with self._cond:
+                self._stats["completed"] += 1
+            return result
+
+    def stream(self, fn, *args, priority=PRIORITY_STANDARD, **kwargs):
+        """
+        스트리밍 호출. fn(*args, **kwargs) 가 돌려준 이터러블의 조각을 그대로 yield 하며,
+        이터레이터가 끝나거나 닫힐 때까지 동시 실행 슬롯을 잡고 있습니다.
+        첫 조각을 받기 전의 오류만 재시도하고(이미 보낸 조각이 중복되지 않도록),
+        스트림 도중 오류도 서킷 브레이커에 반영합니다.
+
+        Raises:
+            CircuitOpenError: 서킷 브레이커가 열려 있을 때
+            Exception: 재시도 불가 오류, 재시도 소진, 또는 스트림 도중 오류
+        """
+        with self._cond:
+            self._stats["submitted"] += 1
+
+        attempt = 0
+        while True:
+            self._before_call()
+            self._acquire(priority)
+            yielded = False
+            try:
+                for chunk in fn(*args, **kwargs):
+                    yielded = True
+                    yield chunk
+            except GeneratorExit:
+                # 소비자가 먼저 닫음 (클라이언트 연결 종료 등): 업스트림은 정상
+                self._release()
+                self._on_success()
+                with self._cond:
+                    self._stats["completed"] += 1
+                raise
+            except Exception as e:
+                self._release()
+                retryable = is_retryable(e)
+                self._on_failure(retryable)
+                if yielded or not retryable or attempt >= self.max_retries:
+                    with self._cond:
+                        self._stats["failed"] += 1
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                logger.warning("LLM 스트림 재시도 %d/%d (%.2f초 후): %s", attempt, self.max_retries, delay, e)
+                time.sleep(delay)
+                continue
+
+            self._release()
+            self._on_success()
+            with self._cond:
+                self._stats["completed"] += 1
+            return
+
+    def stats(self):
+        with self._cond:
+            waiting = {name: 0 for name in LANE_NAMES.values()}
+            for priority, _ in self._waiting:
+                waiting[LANE_NAMES.get(priority, str(priority))] += 1
+            started = self._stats["submitted"] or 1
+            return {
+                **{k: v for k, v in self._stats.items() if k != "wait_total"},
+                "running": self._running,
+                "max_concurrency": self.max_concurrency,
+                "waiting": waiting,
+                "wait_avg": round(self._stats["wait_total"] / started, 4),
+                "breaker_state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+            }
+
+
+scheduler = LLMScheduler()
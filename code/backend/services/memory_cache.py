@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+class CompressedLRU:
+    """
+    프로세스 로컬 LRU 캐시.
+
+    값은 JSON 직렬화 후 zlib 으로 압축해 보관하고, 항목 수와 압축 바이트 합계
+    두 기준으로 용량을 제한합니다. (uvicorn 워커당 메모리 상한 고정)
+    여러 스레드에서 동시에 접근해도 안전합니다.
+    """
+
+    def __init__(self, name, max_entries=256, max_bytes=16 * 1024 * 1024, ttl=None, level=6):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.level = level
+
+        self._data = OrderedDict()  # key -> (압축 blob, 저장 시각 epoch)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get_entry(self, key):
+        """
+        (값, 저장 시각) 을 반환합니다. TTL 은 검사하지 않습니다. 없으면 None.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        blob, stored_at = entry
+        return json.loads(zlib.decompress(blob)), stored_at
+
+    def get(self, key):
+        """TTL 안에 있는 값만 반환합니다. 만료된 항목은 제거하고 None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[1] >= self.ttl:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return json.loads(zlib.decompress(entry[0]))
+
+    def set(self, key, value, stored_at=None):
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), self.level)
+        if len(blob) > self.max_bytes:
+            return  # 단일 항목이 상한을 넘으면 보관하지 않음
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (blob, stored_at if stored_at is not None else time.time())
+            self._bytes += len(blob)
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        blob, _ = self._data.pop(key)
+        self._bytes -= len(blob)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
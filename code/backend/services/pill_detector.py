@@ -0,0 +1,220 @@
+"""
+알약 사진 하이브리드 식별
+
+직접 학습한 RT-DETR(118개 클래스, 가중치와 함께 배포되는 model/drug_mapping.json)로
+먼저 추론하고, 신뢰도가 임계값 이상이면서 매핑에 있는 클래스면 그 결과를 바로 반환합니다.
+애매한 경우에만 Gemini 비전(mode="pill")으로 넘깁니다. 요청마다 어떤 경로가 처리했는지 기록합니다.
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import PIL.Image
+
+from services.img_vision import analyze_health_image
+
+logger = logging.getLogger(__name__)
+
+try:
+    from ultralytics import RTDETR
+except ImportError:  # 탐지기 없이도 서버는 Gemini 경로로 동작
+    RTDETR = None
+
+PILL_MODEL_PATH = os.getenv("PILL_MODEL_PATH", "../model/runs/detect/drug_identification/weights/best.pt")
+# 탐지기 클래스 ID -> 약 매핑 (학습에 쓴 것과 같은 파일이어야 함. backend/drug_mapping.json 과 다름)
+PILL_MAPPING_PATH = os.getenv("PILL_MAPPING_PATH", "../model/drug_mapping.json")
+PILL_DEVICE = os.getenv("PILL_DEVICE", "cpu")
+# 이 값 이상이면 로컬 결과를 그대로 사용
+PILL_LOCAL_CONF_THRESHOLD = float(os.getenv("PILL_LOCAL_CONF_THRESHOLD", "0.6"))
+# 후보로 남길 최소 신뢰도 (inference.py 기본값과 동일)
+PILL_DETECT_MIN_CONF = float(os.getenv("PILL_DETECT_MIN_CONF", "0.25"))
+PILL_DETECT_IOU = 0.45
+
+_model = None
+_model_lock = threading.Lock()
+_model_unavailable = False
+# ultralytics predictor 는 스레드 안전하지 않아 추론은 한 번에 하나씩
+_predict_lock = threading.Lock()
+_label_map = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "local": {"requests": 0, "seconds": 0.0},
+    "gemini": {"requests": 0, "seconds": 0.0},
+}
+
+
+def _get_model():
+    """RT-DETR 모델을 한 번만 로드합니다. 사용할 수 없으면 None."""
+    global _model, _model_unavailable
+    if _model is not None or _model_unavailable:
+        return _model
+    with _model_lock:
+        if _model is None and not _model_unavailable:
+            if RTDETR is None or not os.path.exists(PILL_MODEL_PATH):
+                print(f"⚠️ 로컬 알약 탐지기를 사용할 수 없습니다 (ultralytics 또는 {PILL_MODEL_PATH} 없음). Gemini 로만 식별합니다.")
+                _model_unavailable = True
+            else:
+                _model = RTDETR(PILL_MODEL_PATH)
+                print(f"✅ 로컬 알약 탐지기 로드 완료: {PILL_MODEL_PATH}")
+    return _model
+
+
+def get_label_map():
+    """PILL_MAPPING_PATH 를 한 번만 로드합니다. 없으면 빈 매핑 (모든 요청이 Gemini 로 감)."""
+    global _label_map
+    if _label_map is None:
+        with _model_lock:
+            if _label_map is None:
+                if os.path.exists(PILL_MAPPING_PATH):
+                    with open(PILL_MAPPING_PATH, "r", encoding="utf-8") as f:
+                        _label_map = json.load(f)
+                    print(f"✅ 알약 탐지기 매핑 로드: {PILL_MAPPING_PATH} ({len(_label_map)}개 클래스)")
+                else:
+                    print(f"⚠️ 알약 탐지기 매핑 파일이 없습니다: {PILL_MAPPING_PATH}. Gemini 로만 식별합니다.")
+                    _label_map = {}
+    return _label_map
+
+
+def map_to_drug(class_id, label_map):
+    """클래스 ID -> (품목코드, 약품명) (model/inference.py 의 map_to_drug_name 과 동일 규칙)"""
+    info = label_map.get(str(class_id))
+    if info:
+        return info.get("code", ""), info.get("name", f"Unknown (ID: {class_id})")
+    return "", f"Unknown (ID: {class_id})"
+
+
+def detect_pills(raw, label_map):
+    """
+    로컬 RT-DETR 추론.
+
+    Returns:
+        신뢰도 내림차순 검출 리스트, 탐지기를 쓸 수 없으면 None
+        [{"class_id", "mapped", "confidence", "bbox", "code", "name"}, ...]
+    """
+    model = _get_model()
+    if model is None:
+        return None
+
+    img = PIL.Image.open(io.BytesIO(raw)).convert("RGB")
+    with _predict_lock:
+        results = model.predict(
+            source=img,
+            conf=PILL_DETECT_MIN_CONF,
+            iou=PILL_DETECT_IOU,
+            device=PILL_DEVICE,
+            verbose=False,
+        )
+
+    detections = []
+    boxes = results[0].boxes
+    if boxes is not None and len(boxes) > 0:
+        for i in range(len(boxes)):
+            class_id = int(boxes.cls[i].item())
+            code, name = map_to_drug(class_id, label_map)
+            detections.append({
+                "class_id": class_id,
+                "mapped": str(class_id) in label_map,
+                "confidence": float(boxes.conf[i].item()),
+                "bbox": boxes.xyxy[i].cpu().numpy().tolist(),
+                "code": code,
+                "name": name,
+            })
+    detections.sort(key=lambda d: d["confidence"], reverse=True)
+    return detections
+
+
+def _norm_label(name):
+    return "".join(str(name or "").split()).lower()
+
+
+def _match_label(name, label_map):
+    """
+    Gemini 가 읽은 약 이름을 매핑 파일의 클래스와 맞춰 봅니다. (공백/대소문자 무시)
+    정확히 같은 이름이 우선이고, 부분 일치는 후보가 하나뿐일 때만 인정합니다.
+    ("타이레놀" 처럼 여러 제품에 걸리는 이름이나 너무 짧은 문자열은 None)
+    """
+    target = _norm_label(name)
+    if len(target) < 2:
+        return None
+    candidates = set()
+    for class_id, info in label_map.items():
+        label = _norm_label(info.get("name"))
+        if not label:
+            continue
+        if label == target:
+            return int(class_id)
+        if target in label or label in target:
+            candidates.add(int(class_id))
+    return candidates.pop() if len(candidates) == 1 else None
+
+
+def _record(path, started):
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        _stats[path]["requests"] += 1
+        _stats[path]["seconds"] += elapsed
+    logger.info("알약 식별 경로=%s (%.0fms)", path, elapsed * 1000)
+    return round(elapsed * 1000, 1)
+
+
+def identify_pill(raw, label_map=None):
+    """
+    알약 사진 식별: 로컬 탐지기 우선, 신뢰도가 낮거나 매핑에 없는 클래스면 Gemini 로 폴백.
+
+    Args:
+        raw (bytes): 이미지 바이트
+        label_map (dict): 탐지기 클래스 매핑 (기본: PILL_MAPPING_PATH)
+
+    Returns:
+        dict: "source" 에 처리 경로("local" / "gemini") 포함
+    """
+    label_map = get_label_map() if label_map is None else label_map
+    started = time.perf_counter()
+    try:
+        detections = detect_pills(raw, label_map)
+    except Exception as e:
+        logger.warning("로컬 알약 탐지 실패, Gemini 로 전환: %s", e)
+        detections = None
+
+    # 최상위 후보가 매핑에 없는 클래스면 이름을 알 수 없으므로 로컬 결과로 응답하지 않음
+    if detections and detections[0]["confidence"] >= PILL_LOCAL_CONF_THRESHOLD and detections[0]["mapped"]:
+        confident = [d for d in detections if d["confidence"] >= PILL_LOCAL_CONF_THRESHOLD and d["mapped"]]
+        return {
+            "source": "local",
+            "best_match": confident[0],
+            "detections": confident,
+            "elapsed_ms": _record("local", started),
+        }
+
+    result = analyze_health_image(raw, mode="pill")
+    for pill in result.get("pills", []) if isinstance(result, dict) else []:
+        pill["class_id"] = _match_label(pill.get("name"), label_map)
+    return {
+        **result,
+        "source": "gemini",
+        # 로컬 탐지기가 낸 저신뢰 후보도 참고용으로 함께 반환
+        "local_candidates": (detections or [])[:3],
+        "elapsed_ms": _record("gemini", started),
+    }
+
+
+def router_stats():
+    with _stats_lock:
+        total = sum(v["requests"] for v in _stats.values())
+        return {
+            "threshold": PILL_LOCAL_CONF_THRESHOLD,
+            "detector_loaded": _model is not None,
+            "mapped_classes": len(_label_map) if _label_map is not None else None,
+            "local_ratio": round(_stats["local"]["requests"] / total, 4) if total else 0.0,
+            **{
+                path: {
+                    "requests": v["requests"],
+                    "avg_ms": round(v["seconds"] * 1000 / v["requests"], 1) if v["requests"] else 0.0,
+                }
+                for path, v in _stats.items()
+            },
+        }